@@ -1,9 +1,9 @@
+import time
+_START_TIME = time.perf_counter()
+
 import os
-import csv
-from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from datetime import datetime
+import logging
+import threading
 from kivy.app import App
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.popup import Popup
@@ -14,287 +14,121 @@ from kivy.uix.button import Button
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.scrollview import ScrollView
-from kivy.uix.scatterlayout import ScatterLayout
 from kivy.uix.image import Image
 from kivy.uix.textinput import TextInput
 from kivy.core.window import Window
 from kivy.clock import Clock
-from fpdf import FPDF  # pip install fpdf
 from kivy.uix.scatter import Scatter
-
-# Import Tkinter for file dialog (works if Tkinter is installed)
-from tkinter import Tk, filedialog
-
-# Set a "phone-like" window size (portrait)
-Window.size = (360, 640)
-
-DATA_CSV = "mornfeels_data.csv"
-SETTINGS_FILE = "settings.csv"
-CHART_OUTPUT_DIR = "generated_charts"
-
-# ---------------------- CSV and Settings Functions ----------------------------
-
-def init_csv(file_path):
-    """Create the CSV file with headers if it does not exist."""
-    if not os.path.exists(file_path):
-        with open(file_path, mode='w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file, delimiter=';')
-            writer.writerow(['Date', 'Time', 'Value', 'Note'])
-
-
-def save_entry(file_path, mood, note):
-    """Save a new entry in the CSV file with the current date and time."""
-    now = datetime.now()
-    date_str = now.strftime("%Y-%m-%d")
-    time_str = now.strftime("%H:%M:%S")
-    with open(file_path, mode='a', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file, delimiter=';')
-        writer.writerow([date_str, time_str, mood, note])
-
-
-def load_unique_dates_from_csv():
+from kivy.uix.behaviors import ButtonBehavior
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.properties import StringProperty
+from kivy.uix.progressbar import ProgressBar
+
+# Storage, settings and analysis live in the GUI-free core.
+# Plotting (matplotlib), PDF (fpdf) and file dialogs (tkinter) are imported
+# only when Visualize / Save to PDF are first used, to keep start-up fast.
+from mornfeels_core import (
+    default_data_path,
+    init_csv,
+    save_entry,
+    load_unique_dates_from_csv,
+    load_settings,
+    save_settings,
+    aggregate_date_range,
+    get_statistics,
+    ROLLING_WINDOWS,
+)
+# Importing mornfeels_charts is cheap; matplotlib/fpdf load on first render
+import mornfeels_charts
+import mornfeels_trace
+from mornfeels_reminders import ReminderScheduler
+from mornfeels_charts import CHART_LINE, CHART_DAILY_PIE, CHART_BAR, CHART_SUMMARY_PIE, CHART_PIE_GRID
+
+log = logging.getLogger(__name__)
+
+# ---------------------- Background Generation ----------------------------
+
+
+class ChartGenerationJob:
     """
-    Read DATA_CSV and return a sorted list of unique dates (YYYY-MM-DD).
+    Generates the selected charts on a background thread so the UI never blocks.
+    The callbacks are always invoked on the Kivy main thread (via Clock):
+      on_chart(path)                      each chart as soon as it is saved
+      on_progress(done, total)            after each chart
+      on_finished(paths, cancelled, error) once, at the end
     """
-    if not os.path.exists(DATA_CSV):
-        print("DEBUG: DATA_CSV not found.")
-        return []
-    dates = set()
-    with open(DATA_CSV, mode='r', encoding='utf-8') as f:
-        reader = csv.reader(f, delimiter=';')
-        header = next(reader, None)
-        for row in reader:
-            if len(row) >= 3:
-                dates.add(row[0])
-    unique_dates = sorted(dates)
-    print("DEBUG: Unique dates loaded:", unique_dates)
-    return unique_dates
-
-
-def filter_data_by_dates(start_date, end_date):
-    """
-    Filter data from DATA_CSV between start_date and end_date (inclusive).
-    Assumes dates are in the format YYYY-MM-DD.
-    Returns a list of rows.
-    """
-    data = []
-    with open(DATA_CSV, mode='r', encoding='utf-8') as f:
-        reader = csv.reader(f, delimiter=';')
-        header = next(reader, None)
-        for row in reader:
-            if len(row) >= 3:
-                d = row[0]
-                if start_date <= d <= end_date:
-                    data.append(row)
-    print(f"DEBUG: Filtered data count between {start_date} and {end_date}: {len(data)}")
-    return data
-
-
-
-def load_settings():
-    """Load reminder times from SETTINGS_FILE as a list of (hour, minute) tuples."""
-    if not os.path.exists(SETTINGS_FILE):
-        return [(8, 0), (12, 0), (16, 0), (20, 0)]
-    times = []
-    with open(SETTINGS_FILE, mode='r', newline='', encoding='utf-8') as file:
-        reader = csv.reader(file, delimiter=';')
-        for row in reader:
-            if len(row) == 2:
-                try:
-                    hour = int(row[0])
-                    minute = int(row[1])
-                    times.append((hour, minute))
-                except ValueError:
-                    pass
-    return sorted(times)
-
-
-def save_settings(times):
-    """Save the list of (hour, minute) tuples to SETTINGS_FILE."""
-    with open(SETTINGS_FILE, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file, delimiter=';')
-        for (hour, minute) in times:
-            writer.writerow([hour, minute])
-
-
-# ---------------------- Chart Generation  ----------------------------
-
-
-def create_line_chart(filtered_data):
-    if not os.path.exists(CHART_OUTPUT_DIR):
-        os.makedirs(CHART_OUTPUT_DIR)
-
-    # 1) Parse data into {date_obj: [values]} dict
-    day_values = {}
-    for row in filtered_data:
-        d_str = row[0]  # e.g. "2025-01-01"
+    def __init__(self, start_date, end_date, chart_types,
+                 on_chart=None, on_progress=None, on_finished=None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.chart_types = chart_types
+        self.on_chart = on_chart
+        self.on_progress = on_progress
+        self.on_finished = on_finished
+        self.paths = []
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        """Stop after the chart currently being rendered."""
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def _post(self, callback, *args):
+        if callback is not None:
+            Clock.schedule_once(lambda dt: callback(*args))
+
+    def _run(self):
+        error = None
         try:
-            d_obj = datetime.strptime(d_str, "%Y-%m-%d")
-            val = int(row[2])
-        except ValueError:
-            continue
-        day_values.setdefault(d_obj, []).append(val)
-
-    # 2) Sort dates and compute daily averages
-    sorted_dates = sorted(day_values.keys())
-    averages = [sum(day_values[d]) / len(day_values[d]) for d in sorted_dates]
-
-    # 3) Plot
-    plt.figure(figsize=(6, 4))
-    plt.plot(sorted_dates, averages, marker='o', color="blue")
-    plt.title("Daily Average Mood")
-    plt.xlabel("Date")
-    plt.ylabel("Average Mood")
-
-    # 4) Configure x-axis to handle dates
-    ax = plt.gca()
-    # Use an automatic date locator (reduces overlap by limiting ticks)
-    ax.xaxis.set_major_locator(mdates.AutoDateLocator(maxticks=10))
-    # Format the dates in a short format, e.g. "Jan-01"
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%b-%d'))
-
-    # 5) Rotate and reduce font size to avoid overlap
-    plt.xticks(rotation=45, fontsize=8)
-
-    # 6) Save the figure
-    out_path = os.path.join(CHART_OUTPUT_DIR, "line_chart.png")
-    plt.tight_layout()
-    plt.savefig(out_path, bbox_inches='tight')
-    plt.close()
-
-    return out_path
-
-
-def create_daily_pie_charts(filtered_data):
-    if not os.path.exists(CHART_OUTPUT_DIR):
-        os.makedirs(CHART_OUTPUT_DIR)
-
-    color_mapping = {
-        6: "lightgreen", 5: "darkgreen",
-        4: "lightsalmon", 3: "darkred",
-        2: "lightgrey",   1: "darkgrey",
-        0: "black"
-    }
-
-    unique_dates = sorted(set(row[0] for row in filtered_data))
-    paths = []
-    for d in unique_dates:
-        day_data = [row for row in filtered_data if row[0] == d]
-        frequency = {}
-        for row in day_data:
-            try:
-                val = int(row[2])
-            except ValueError:
-                continue
-            frequency[val] = frequency.get(val, 0) + 1
-
-        # Prepare data for pie
-        labels, sizes, colors = [], [], []
-        for val in sorted(frequency.keys(), reverse=True):
-            labels.append(str(val))
-            sizes.append(frequency[val])
-            colors.append(color_mapping.get(val, "grey"))
-        if not sizes:
-            continue
-
-        date_tag = d.replace("-", "")
-        out_path = os.path.join(CHART_OUTPUT_DIR, f"pie_{date_tag}.png")
-
-        # Ensure a white background
-        plt.figure(figsize=(5, 3), facecolor="white")
-        plt.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%')
-        plt.title(f"Pie Chart for {d}")
-        plt.savefig(out_path, bbox_inches='tight', facecolor="white")
-        plt.close()
-        paths.append(out_path)
-    return paths
-
-
-def create_bar_chart(filtered_data):
-    """Create a bar chart and return the PNG path."""
-    if not os.path.exists(CHART_OUTPUT_DIR):
-        os.makedirs(CHART_OUTPUT_DIR)
-    # Count frequencies overall
-    frequency = {}
-    for row in filtered_data:
-        try:
-            val = int(row[2])
-        except ValueError:
-            continue
-        frequency[val] = frequency.get(val, 0) + 1
-    # Sort keys (for example, in descending order)
-    keys = sorted(frequency.keys(), reverse=True)
-    values = [frequency[k] for k in keys]
-    color_mapping = {
-        6: "lightgreen",
-        5: "darkgreen",
-        4: "lightsalmon",
-        3: "darkred",
-        2: "lightgrey",
-        1: "darkgrey",
-        0: "black"
-    }
-    colors = [color_mapping.get(k, "grey") for k in keys]
-    plt.figure(figsize=(5, 3))
-    plt.bar([str(k) for k in keys], values, color=colors)
-    plt.title("Bar Chart Example")
-    out_path = os.path.join(CHART_OUTPUT_DIR, "bar_chart.png")
-    plt.savefig(out_path, bbox_inches='tight')
-    plt.close()
-    return out_path
-
-
-def create_summary_pie_chart(filtered_data):
-    """Create a summary pie chart and return the PNG path."""
-    if not os.path.exists(CHART_OUTPUT_DIR):
-        os.makedirs(CHART_OUTPUT_DIR)
-    frequency = {}
-    for row in filtered_data:
+            with mornfeels_trace.span("generate"):
+                self._generate()
+        except Exception as e:
+            error = e
+        if mornfeels_trace.enabled():
+            # Where this Generate click spent its time (MORNFEELS_TRACE=1)
+            log.info("Chart generation trace:\n%s", mornfeels_trace.summary_text())
+        self._post(self.on_finished, list(self.paths), self._cancel.is_set(), error)
+
+    def _generate(self):
+        # One parse and one group-by, shared by every selected chart
+        aggregate = aggregate_date_range(self.start_date, self.end_date)
+        total = mornfeels_charts.count_charts(aggregate, self.chart_types)
+        self._post(self.on_progress, 0, total)
+        charts = mornfeels_charts.iter_charts(aggregate, self.chart_types)
         try:
-            val = int(row[2])
-        except ValueError:
-            continue
-        frequency[val] = frequency.get(val, 0) + 1
-    keys = sorted(frequency.keys(), reverse=True)
-    sizes = [frequency[k] for k in keys]
-    color_mapping = {
-        6: "lightgreen",
-        5: "darkgreen",
-        4: "lightsalmon",
-        3: "darkred",
-        2: "lightgrey",
-        1: "darkgrey",
-        0: "black"
-    }
-    colors = [color_mapping.get(k, "grey") for k in keys]
-    plt.figure(figsize=(5, 3))
-    plt.pie(sizes, labels=[str(k) for k in keys], colors=colors, autopct='%1.1f%%')
-    plt.title("Summary Pie Chart")
-    out_path = os.path.join(CHART_OUTPUT_DIR, "summary_pie.png")
-    plt.savefig(out_path, bbox_inches='tight')
-    plt.close()
-    return out_path
-
-
-def generate_pdf_from_images(image_paths, output_pdf):
-    """Combine the given PNG images into a PDF using FPDF."""
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=10)
-    for img_path in image_paths:
-        pdf.add_page()
-        pdf.image(img_path, x=10, y=10, w=180)
-    pdf.output(output_pdf, "F")
+            for path in charts:
+                self.paths.append(path)
+                # The gallery shows small thumbnails; full size only on zoom
+                mornfeels_charts.make_thumbnail(path)
+                self._post(self.on_chart, path)
+                self._post(self.on_progress, len(self.paths), total)
+                if self._cancel.is_set():
+                    break
+        finally:
+            # Cancels pooled renders that have not started yet
+            charts.close()
 
 
 # ---------------------- Popup Classes ----------------------------
 
 
 class ReminderPopup(Popup):
-    """Popup to add a new mood entry."""
-    def __init__(self, file_path, **kwargs):
+    """Popup to add a new mood entry (due: the reminders that prompted it, if any)."""
+    def __init__(self, file_path, due=None, **kwargs):
         super().__init__(**kwargs)
         self.file_path = file_path
         self.title = "Reminder"
+        missed = [fire_time for fire_time, was_missed in (due or []) if was_missed]
+        if missed:
+            self.title = "Reminder (missed " + ", ".join(t.strftime("%H:%M") for t in missed[-3:]) + ")"
         self.size_hint = (0.8, 0.5)
         self.auto_dismiss = False
 
@@ -402,7 +236,7 @@ class SettingsPopup(Popup):
                         self.main_screen.reminder_times.append((hour, minute))
                         self.main_screen.reminder_times.sort()
                         save_settings(self.main_screen.reminder_times)
-                        self.main_screen.schedule_daily_reminders()
+                        self.main_screen.reminders.add_time(hour, minute)
                         self.update_times_grid()
             except ValueError:
                 pass
@@ -418,72 +252,147 @@ class SettingsPopup(Popup):
                 if (hour, minute) in self.main_screen.reminder_times:
                     self.main_screen.reminder_times.remove((hour, minute))
                     save_settings(self.main_screen.reminder_times)
-                    self.main_screen.schedule_daily_reminders()
+                    self.main_screen.reminders.remove_time(hour, minute)
                     self.update_times_grid()
             except ValueError:
                 pass
         self.time_input.text = ""
 
 
+class ChartTile(ButtonBehavior, Image):
+    """
+    One gallery row: a chart thumbnail. RecycleView reuses tiles as the user
+    scrolls; nocache makes sure a texture is released as soon as its tile
+    shows a different chart. Tapping opens the full-resolution chart.
+    """
+    full_source = StringProperty("")
+
+    def __init__(self, **kwargs):
+        super().__init__(nocache=True, **kwargs)
+
+    def on_release(self):
+        if self.full_source:
+            ChartZoomPopup(self.full_source).open()
+
+
+class ChartZoomPopup(Popup):
+    """Full-resolution chart in a Scatter for zoom/drag; loaded only while open."""
+    def __init__(self, img_path, **kwargs):
+        super().__init__(**kwargs)
+        self.title = os.path.basename(img_path)
+        self.size_hint = (0.95, 0.9)
+        layout = BoxLayout(orientation='vertical', spacing=10, padding=10)
+        scatter_area = FloatLayout(size_hint=(1, 0.85))
+        scatter = Scatter(do_rotation=False, size_hint=(None, None), size=(320, 320),
+                          pos_hint={'center_x': 0.5, 'center_y': 0.5})
+        scatter.add_widget(Image(source=os.path.abspath(img_path), nocache=True,
+                                 size_hint=(None, None), size=(320, 320)))
+        scatter_area.add_widget(scatter)
+        layout.add_widget(scatter_area)
+        close_btn = Button(text="Close", size_hint=(1, 0.15))
+        close_btn.bind(on_press=self.dismiss)
+        layout.add_widget(close_btn)
+        self.content = layout
+
+
 class VisualizationResultsPopup(Popup):
     """
-    Displays the generated charts in a scrollable, zoomable layout.
-    Contains a "Save to PDF" button.
+    Displays the generated charts in a virtualized, scrollable gallery:
+    only the visible rows exist as widgets, and they show small thumbnails.
+    Tapping a chart opens it at full resolution for zooming.
+    Contains "Save to PDF" (the PNGs shown) and, when the chart request is
+    known, "Vector PDF" (charts re-drawn straight into the PDF as vectors).
+    chart_request is (start_date, end_date, chart_types).
     """
-    def __init__(self, image_paths, **kwargs):
+    def __init__(self, image_paths, chart_request=None, **kwargs):
         super().__init__(**kwargs)
         self.title = "Visualization Results"
         self.size_hint = (0.95, 0.9)
+        # Charts still being generated are appended later via add_image()
+        self.image_paths = []
+        self.chart_request = chart_request
 
         # Main vertical layout
         main_layout = BoxLayout(orientation='vertical', spacing=10, padding=10)
 
-        # Scrollable area for the images
-        scroll_view = ScrollView(size_hint=(1, 0.85), do_scroll_x=False)
-        # Use a vertical BoxLayout inside the ScrollView
-        images_layout = BoxLayout(orientation='vertical', size_hint_y=None, spacing=10)
-        images_layout.bind(minimum_height=images_layout.setter('height'))
+        # Virtualized list of thumbnails
+        self.gallery = RecycleView(size_hint=(1, 0.85), do_scroll_x=False)
+        self.gallery.viewclass = ChartTile
+        rows_layout = RecycleBoxLayout(orientation='vertical', spacing=10,
+                                       default_size=(None, 300), default_size_hint=(1, None),
+                                       size_hint_y=None)
+        rows_layout.bind(minimum_height=rows_layout.setter('height'))
+        self.gallery.add_widget(rows_layout)
 
         for img_path in image_paths:
-            # Wrap each image in a Scatter for zoom/drag functionality
-            scatter = Scatter(size_hint=(1, None), height=300)
-            # Use absolute path for the image
-            image = Image(source=os.path.abspath(img_path),
-                          size_hint=(None, None), size=(300, 300))
-            scatter.add_widget(image)
-            images_layout.add_widget(scatter)
+            self.add_image(img_path)
 
-        scroll_view.add_widget(images_layout)
-        main_layout.add_widget(scroll_view)
+        main_layout.add_widget(self.gallery)
 
         # Bottom buttons: "Save to PDF" and "Close"
         btn_layout = BoxLayout(orientation='horizontal', size_hint=(1, 0.15), spacing=10)
         pdf_btn = Button(text="Save to PDF")
-        pdf_btn.bind(on_press=lambda x: self.on_save_pdf(image_paths))
+        pdf_btn.bind(on_press=lambda x: self.on_save_pdf(self.image_paths))
+        btn_layout.add_widget(pdf_btn)
+        if chart_request is not None:
+            vector_btn = Button(text="Vector PDF")
+            vector_btn.bind(on_press=self.on_save_vector_pdf)
+            btn_layout.add_widget(vector_btn)
         close_btn = Button(text="Close")
         close_btn.bind(on_press=self.dismiss)
-        btn_layout.add_widget(pdf_btn)
         btn_layout.add_widget(close_btn)
         main_layout.add_widget(btn_layout)
 
         self.content = main_layout
 
-    def on_save_pdf(self, image_paths):
+    def add_image(self, img_path):
+        """Append one chart to the gallery (its thumbnail, if one was made)."""
+        self.image_paths.append(img_path)
+        full_source = os.path.abspath(img_path)
+        thumb_path = mornfeels_charts.thumbnail_path(img_path)
+        source = os.path.abspath(thumb_path) if os.path.exists(thumb_path) else full_source
+        self.gallery.data.append({'source': source, 'full_source': full_source})
+
+    def _ask_pdf_path(self):
         from tkinter import Tk, filedialog
         root = Tk()
         root.withdraw()
         save_path = filedialog.asksaveasfilename(defaultextension=".pdf",
                                                  filetypes=[("PDF files", "*.pdf")])
-        if save_path:
-            generate_pdf_from_images(image_paths, output_pdf=save_path)
         root.destroy()
+        return save_path
+
+    def on_save_pdf(self, image_paths):
+        save_path = self._ask_pdf_path()
+        if save_path:
+            mornfeels_charts.generate_pdf_from_images(image_paths, output_pdf=save_path)
+
+    def on_save_vector_pdf(self, instance):
+        save_path = self._ask_pdf_path()
+        if save_path:
+            start_date, end_date, chart_types = self.chart_request
+            mornfeels_charts.export_pdf(aggregate_date_range(start_date, end_date),
+                                        chart_types, save_path, vector=True)
+
+
+def trend_text(statistics):
+    """Rolling averages and the best hour of day, for the Visualize popup."""
+    parts = []
+    for window in ROLLING_WINDOWS:
+        mean, count = statistics.rolling_mean(window)
+        parts.append(f"Last {window} days: {mean:.1f}" if count else f"Last {window} days: -")
+    profile = statistics.hour_profile()
+    if profile:
+        hour, _, mean, _ = max(profile, key=lambda item: item[2])
+        parts.append(f"Best hour: {hour:02d}:00 ({mean:.1f})")
+    return "    ".join(parts)
 
 
 class VisualizePopup(Popup):
     """
     Popup to select the date range and desired chart types.
     The top row has the Start and End Date spinners,
-    followed by a 2x2 grid with checkboxes (each next to its label),
+    followed by a two-column grid with checkboxes (each next to its label),
     and at the bottom, the "Generate" and "Close" buttons side by side.
     """
     def __init__(self, **kwargs):
@@ -499,8 +408,12 @@ class VisualizePopup(Popup):
         date_layout.add_widget(self.start_spinner)
         date_layout.add_widget(self.end_spinner)
         main_layout.add_widget(date_layout)
-        # Row 2: 2x2 grid for chart options
-        grid = GridLayout(cols=2, size_hint=(1, 0.3), spacing=10)
+        # Trend statistics, filled in by a background thread (the first use
+        # may build them from the whole journal)
+        self.trend_label = Label(text="Loading statistics...", size_hint=(1, 0.08))
+        main_layout.add_widget(self.trend_label)
+        # Row 2: two-column grid for chart options
+        grid = GridLayout(cols=2, size_hint=(1, 0.4), spacing=10)
         box1 = BoxLayout(orientation='horizontal', spacing=5)
         self.checkbox_line = CheckBox(size_hint=(None, None), size=(40, 40))
         box1.add_widget(self.checkbox_line)
@@ -521,50 +434,128 @@ class VisualizePopup(Popup):
         box4.add_widget(self.checkbox_summary_pie)
         box4.add_widget(Label(text="Summary Pie Chart", halign="left"))
         grid.add_widget(box4)
+        box5 = BoxLayout(orientation='horizontal', spacing=5)
+        self.checkbox_pie_grid = CheckBox(size_hint=(None, None), size=(40, 40))
+        box5.add_widget(self.checkbox_pie_grid)
+        box5.add_widget(Label(text="Daily Pies (Grid)", halign="left"))
+        grid.add_widget(box5)
         main_layout.add_widget(grid)
-        # Row 3: Buttons "Generate" and "Close"
+        # Row 3: Progress of a running generation
+        progress_layout = BoxLayout(orientation='horizontal', size_hint=(1, 0.1), spacing=10)
+        self.progress_bar = ProgressBar(max=1, value=0, size_hint=(0.6, 1))
+        progress_layout.add_widget(self.progress_bar)
+        self.progress_label = Label(text="", size_hint=(0.4, 1))
+        progress_layout.add_widget(self.progress_label)
+        main_layout.add_widget(progress_layout)
+        # Row 4: Buttons "Generate", "Cancel" and "Close"
         btn_layout = BoxLayout(orientation='horizontal', size_hint=(1, 0.15), spacing=10)
-        generate_btn = Button(text="Generate", size_hint=(0.5, 1))
-        generate_btn.bind(on_press=self.on_generate)
-        btn_layout.add_widget(generate_btn)
-        close_btn = Button(text="Close", size_hint=(0.5, 1))
+        self.generate_btn = Button(text="Generate", size_hint=(0.34, 1))
+        self.generate_btn.bind(on_press=self.on_generate)
+        btn_layout.add_widget(self.generate_btn)
+        self.cancel_btn = Button(text="Cancel", size_hint=(0.33, 1), disabled=True)
+        self.cancel_btn.bind(on_press=self.on_cancel)
+        btn_layout.add_widget(self.cancel_btn)
+        close_btn = Button(text="Close", size_hint=(0.33, 1))
         close_btn.bind(on_press=self.dismiss)
         btn_layout.add_widget(close_btn)
         main_layout.add_widget(btn_layout)
         self.content = main_layout
+        self.job = None
+        self.results_popup = None
+        self.chart_request = None
+        threading.Thread(target=self._load_trend, daemon=True).start()
+
+    def _load_trend(self):
+        try:
+            text = trend_text(get_statistics())
+        except Exception:
+            log.exception("Loading the statistics failed")
+            text = "Statistics unavailable"
+        Clock.schedule_once(lambda dt: setattr(self.trend_label, "text", text))
 
     def on_generate(self, instance):
         start_date = self.start_spinner.text
         end_date = self.end_spinner.text
         if not start_date or not end_date or start_date == "Start Date" or end_date == "End Date":
             return
-        filtered_data = filter_data_by_dates(start_date, end_date)
-        image_paths = []
+        chart_types = []
         if self.checkbox_line.active:
-            image_paths.append(create_line_chart(filtered_data))
+            chart_types.append(CHART_LINE)
         if self.checkbox_daily_pie.active:
-            image_paths.extend(create_daily_pie_charts(filtered_data))
+            chart_types.append(CHART_DAILY_PIE)
         if self.checkbox_bar.active:
-            image_paths.append(create_bar_chart(filtered_data))
+            chart_types.append(CHART_BAR)
         if self.checkbox_summary_pie.active:
-            image_paths.append(create_summary_pie_chart(filtered_data))
-        if image_paths:
-            results_popup = VisualizationResultsPopup(image_paths)
-            results_popup.open()
+            chart_types.append(CHART_SUMMARY_PIE)
+        if self.checkbox_pie_grid.active:
+            chart_types.append(CHART_PIE_GRID)
+        if not chart_types or self.job is not None:
+            return
+        self.results_popup = None
+        self.chart_request = (start_date, end_date, chart_types)
+        self.generate_btn.disabled = True
+        self.cancel_btn.disabled = False
+        self.progress_bar.value = 0
+        self.progress_label.text = "Loading..."
+        # Filtering and rendering run in the background; the UI keeps drawing
+        self.job = ChartGenerationJob(start_date, end_date, chart_types,
+                                      on_chart=self.on_chart_ready,
+                                      on_progress=self.on_progress,
+                                      on_finished=self.on_generation_finished)
+        self.job.start()
+
+    def on_cancel(self, instance):
+        if self.job is not None:
+            self.job.cancel()
+            self.cancel_btn.disabled = True
+            self.progress_label.text = "Cancelling..."
+
+    def on_dismiss(self):
+        # Closing the popup abandons any running generation
+        if self.job is not None:
+            self.job.cancel()
+
+    def on_chart_ready(self, path):
+        # Show results as soon as the first chart exists; fill in the rest later
+        if self.results_popup is None:
+            self.results_popup = VisualizationResultsPopup([path], chart_request=self.chart_request)
+            self.results_popup.open()
+        else:
+            self.results_popup.add_image(path)
+
+    def on_progress(self, done, total):
+        self.progress_bar.max = max(total, 1)
+        self.progress_bar.value = done
+        self.progress_label.text = f"{done}/{total} charts"
+
+    def on_generation_finished(self, paths, cancelled, error):
+        self.job = None
+        self.generate_btn.disabled = False
+        self.cancel_btn.disabled = True
+        if error is not None:
+            self.progress_label.text = "Generation failed"
+            log.error("Chart generation failed", exc_info=error)
+        elif cancelled:
+            self.progress_label.text = f"Cancelled ({len(paths)} charts)"
+        else:
+            self.progress_label.text = f"Done ({len(paths)} charts)"
 
 
 class MainScreen(FloatLayout):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        init_csv(DATA_CSV)
+        init_csv(default_data_path())
         self.reminder_times = load_settings()
+        # One Clock timer for the earliest reminder, re-armed after each fire or edit
+        self.reminders = ReminderScheduler(self.reminder_times, self.on_reminder, Clock.schedule_once)
+        self.reminder_popup = None
         add_entry_btn = Button(
             text="Add Entry Manually",
             size_hint=(None, None),
             size=(300, 100),
             pos_hint={'center_x': 0.5, 'top': 0.9}
         )
-        add_entry_btn.bind(on_press=lambda x: ReminderPopup(DATA_CSV).open())
+        add_entry_btn.bind(on_press=lambda x: ReminderPopup(default_data_path()).open())
         self.add_widget(add_entry_btn)
         settings_btn = Button(
             text="Settings",
@@ -583,18 +574,36 @@ class MainScreen(FloatLayout):
         visualize_btn.bind(on_press=lambda x: VisualizePopup().open())
         self.add_widget(visualize_btn)
 
-    def schedule_daily_reminders(self):
-        """Placeholder function for daily reminder scheduling."""
-        print("Rescheduling daily reminders for:")
-        for (hour, minute) in self.reminder_times:
-            print(f"  - {hour:02d}:{minute:02d}")
+    def on_reminder(self, due):
+        """Ask for a mood entry; reminders missed while asleep share one popup."""
+        if self.reminder_popup is not None and self.reminder_popup.parent is not None:
+            return
+        self.reminder_popup = ReminderPopup(default_data_path(), due=due)
+        self.reminder_popup.open()
 
 
 class MornfeelsApp(App):
     def build(self):
-        return MainScreen()
+        # Set a "phone-like" window size (portrait)
+        Window.size = (360, 640)
+        self.main_screen = MainScreen()
+        return self.main_screen
+
+    def on_start(self):
+        # From the first import to the main screen being up (MORNFEELS_TRACE=1)
+        mornfeels_trace.record("startup", time.perf_counter() - _START_TIME)
+
+    def on_pause(self):
+        # Keep running in the background (Android) so reminders stay armed
+        return True
+
+    def on_resume(self):
+        # Timers may not advance while the device sleeps: report what was missed
+        self.main_screen.reminders.check()
+
+    def on_stop(self):
+        self.main_screen.reminders.cancel()
 
 
 if __name__ == "__main__":
     MornfeelsApp().run()
-
@@ -0,0 +1,244 @@
+"""
+Benchmarks for Mornfeels on synthetic mood histories. Runs headless (Agg).
+
+Generates deterministic journals of the requested sizes and times the
+storage, filter, chart and PDF functions on them, writing the results as
+JSON so runs of different versions can be compared:
+
+    python mornfeels_bench.py --spans 1m,1y,20y --per-day 4:30 --notes --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+from datetime import date, timedelta
+
+import mornfeels_core
+import mornfeels_charts
+
+BENCH_FORMAT_VERSION = 1
+# Fixed so that the same arguments always produce byte-identical journals
+DEFAULT_END_DATE = date(2025, 1, 1)
+SPAN_UNITS = {"d": 1, "w": 7, "m": 30, "y": 365}
+NOTE_WORDS = ("tired", "coffee", "walk", "work", "rain", "friends", "gym", "late",
+              "sunny", "headache", "reading", "music", "family", "calm", "busy")
+
+
+# ---------------------- Synthetic Histories ----------------------------
+
+
+def parse_span(text):
+    """"30", "30d", "6w", "1m", "20y" -> number of days."""
+    text = text.strip().lower()
+    unit = SPAN_UNITS.get(text[-1:])
+    try:
+        return int(text[:-1]) * unit if unit else int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid span {text!r}, expected e.g. 1m, 1y or 20y")
+
+
+def parse_per_day(text):
+    """"MIN:MAX" or "N" entries per day -> (min, max)."""
+    low, _, high = text.partition(":")
+    try:
+        low, high = int(low), int(high or low)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid entries per day {text!r}, expected MIN:MAX")
+    if not 1 <= low <= high:
+        raise argparse.ArgumentTypeError(f"invalid entries per day {text!r}")
+    return low, high
+
+
+def generate_history(file_path, days, per_day=(4, 30), notes=False, seed=0,
+                     end_date=DEFAULT_END_DATE):
+    """
+    Write a synthetic Date;Time;Value;Note journal of `days` days ending at end_date.
+    Each day has per_day[0]..per_day[1] entries at increasing times; the mood
+    drifts slowly around a per-day baseline. Deterministic for a given seed.
+    Returns the number of rows written.
+    """
+    rng = random.Random(seed)
+    start = end_date - timedelta(days=days - 1)
+    baseline = 3.0
+    rows = 0
+    with open(file_path, mode='w', newline='', encoding='utf-8') as f:
+        f.write("Date;Time;Value;Note\n")
+        for offset in range(days):
+            d_str = (start + timedelta(days=offset)).isoformat()
+            baseline = min(6.0, max(0.0, baseline + rng.uniform(-0.5, 0.5)))
+            count = rng.randint(per_day[0], per_day[1])
+            for second in sorted(rng.sample(range(6 * 3600, 24 * 3600), count)):
+                value = min(6, max(0, round(rng.gauss(baseline, 1.0))))
+                note = ""
+                if notes and rng.random() < 0.3:
+                    note = " ".join(rng.choice(NOTE_WORDS) for _ in range(rng.randint(1, 6)))
+                h, rem = divmod(second, 3600)
+                f.write(f"{d_str};{h:02d}:{rem // 60:02d}:{rem % 60:02d};{value};{note}\n")
+                rows += 1
+    return rows
+
+
+# ---------------------- Timing ----------------------------
+
+
+def _reset_caches(data_path):
+    """Forget everything parsed from data_path, including its sidecar index."""
+    mornfeels_core._date_indexes.pop(data_path, None)
+    mornfeels_core._records_cache.pop(data_path, None)
+    mornfeels_core._storages.pop(data_path, None)
+    numpy_backend = mornfeels_core._numpy_backend()
+    if numpy_backend is not None:
+        numpy_backend._cache.pop(data_path, None)
+    if os.path.exists(data_path + mornfeels_core.DATE_INDEX_SUFFIX):
+        os.remove(data_path + mornfeels_core.DATE_INDEX_SUFFIX)
+
+
+def _timed(func, *args):
+    """(seconds, result) of one call."""
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def _summary(runs):
+    return {"min": min(runs), "median": statistics.median(runs), "runs": runs}
+
+
+def bench_case(work_dir, days, per_day, notes, repeat, chart_days, seed=0):
+    """Generate one journal and time every stage on it. Returns the case result dict."""
+    data_path = os.path.join(work_dir, f"history_{days}d.csv")
+    rows = generate_history(data_path, days, per_day, notes, seed)
+    start = (DEFAULT_END_DATE - timedelta(days=days - 1)).isoformat()
+    end = DEFAULT_END_DATE.isoformat()
+    window_start = (DEFAULT_END_DATE - timedelta(days=min(chart_days, days) - 1)).isoformat()
+    timings = {}
+
+    def record(name, seconds):
+        timings.setdefault(name, []).append(seconds)
+
+    for run in range(repeat):
+        # Cold: no index, no parsed records, empty chart cache
+        _reset_caches(data_path)
+        mornfeels_core.CHART_OUTPUT_DIR = os.path.join(work_dir, f"charts_{days}d_{run}")
+        record("load_unique_dates_from_csv", _timed(mornfeels_core.load_unique_dates_from_csv, data_path)[0])
+        record("load_unique_dates_from_csv_warm",
+               _timed(mornfeels_core.load_unique_dates_from_csv, data_path)[0])
+        record("filter_data_by_dates_all",
+               _timed(mornfeels_core.filter_data_by_dates, start, end, data_path)[0])
+        record("filter_data_by_dates_window",
+               _timed(mornfeels_core.filter_data_by_dates, window_start, end, data_path)[0])
+        seconds, _ = _timed(mornfeels_core.aggregate_date_range, start, end, data_path)
+        record("aggregate_date_range_all", seconds)
+        seconds, aggregate = _timed(mornfeels_core.aggregate_date_range, window_start, end, data_path)
+        record("aggregate_date_range_window", seconds)
+
+        paths = []
+        for name, func in (("create_line_chart", mornfeels_charts.create_line_chart),
+                           ("create_daily_pie_charts", mornfeels_charts.create_daily_pie_charts),
+                           ("create_pie_grid_charts", mornfeels_charts.create_pie_grid_charts),
+                           ("create_bar_chart", mornfeels_charts.create_bar_chart),
+                           ("create_summary_pie_chart", mornfeels_charts.create_summary_pie_chart)):
+            seconds, result = _timed(func, aggregate)
+            record(name, seconds)
+            # Second call: served from the render cache
+            record(name + "_cached", _timed(func, aggregate)[0])
+            paths.extend(result if isinstance(result, list) else [result])
+
+        pdf_path = os.path.join(work_dir, "bench.pdf")
+        record("generate_pdf_from_images", _timed(mornfeels_charts.generate_pdf_from_images,
+                                                  paths, pdf_path)[0])
+
+        # save_entry on a copy, so every run starts from the same journal
+        copy_path = os.path.join(work_dir, "save_entry.csv")
+        shutil.copyfile(data_path, copy_path)
+        _reset_caches(copy_path)
+        mornfeels_core.get_date_index(copy_path)
+        entries = 20
+        started = time.perf_counter()
+        for i in range(entries):
+            mornfeels_core.save_entry(copy_path, i % 7, "bench" if notes else "")
+        record("save_entry", (time.perf_counter() - started) / entries)
+        _reset_caches(copy_path)
+        shutil.rmtree(mornfeels_core.CHART_OUTPUT_DIR, ignore_errors=True)
+
+    return {
+        "span_days": days,
+        "entries_per_day": list(per_day),
+        "notes": notes,
+        "rows": rows,
+        "file_bytes": os.path.getsize(data_path),
+        "chart_days": min(chart_days, days),
+        "charts": len(paths),
+        "timings": {name: _summary(runs) for name, runs in timings.items()},
+    }
+
+
+def run_benchmarks(spans, per_day=(4, 30), notes=False, repeat=3, chart_days=31, seed=0):
+    """Benchmark every span (in days). Returns the JSON-serializable report."""
+    mornfeels_charts._pyplot()  # import matplotlib up front, not inside the first timing
+    chart_dir = mornfeels_core.CHART_OUTPUT_DIR
+    cases = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="mornfeels_bench_") as work_dir:
+            for days in spans:
+                print(f"Benchmarking {days} days ...", file=sys.stderr)
+                cases.append(bench_case(work_dir, days, per_day, notes, repeat, chart_days, seed))
+    finally:
+        mornfeels_core.CHART_OUTPUT_DIR = chart_dir
+        mornfeels_charts.shutdown_render_pool()
+    return {
+        "format": BENCH_FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy_backend": mornfeels_core.USE_NUMPY_BACKEND and mornfeels_core._numpy_backend() is not None,
+        "seed": seed,
+        "repeat": repeat,
+        "cases": cases,
+    }
+
+
+# ---------------------- Entry Point ----------------------------
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="mornfeels_bench.py", description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--spans", default="1m,1y,20y",
+                        type=lambda text: [parse_span(part) for part in text.split(",") if part.strip()],
+                        help="comma-separated history lengths, e.g. 1m,6m,1y,20y (default: 1m,1y,20y)")
+    parser.add_argument("--per-day", type=parse_per_day, default=(4, 30), metavar="MIN:MAX",
+                        help="entries per day (default: 4:30)")
+    parser.add_argument("--notes", action="store_true", help="add free-text notes to about 30%% of entries")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case (default: 3)")
+    parser.add_argument("--chart-days", type=int, default=31,
+                        help="the charts cover the last N days of each history (default: 31)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the generator")
+    parser.add_argument("--no-numpy", action="store_true", help="benchmark the pure Python backend")
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.no_numpy:
+        mornfeels_core.USE_NUMPY_BACKEND = False
+    report = run_benchmarks(args.spans, args.per_day, args.notes, max(1, args.repeat),
+                            args.chart_days, args.seed)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, mode='w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,730 @@
+"""
+Chart rendering and PDF export for Mornfeels.
+
+Kept separate from the Kivy UI code, and matplotlib/fpdf are only imported
+when the first chart or PDF is actually produced, so importing this module
+is cheap. Charts use the non-interactive Agg backend.
+"""
+import os
+import io
+import sys
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import mornfeels_core
+import mornfeels_trace
+from mornfeels_core import MOOD_COLORS
+
+CHART_LINE = "line"
+CHART_DAILY_PIE = "daily_pie"
+CHART_BAR = "bar"
+CHART_SUMMARY_PIE = "summary_pie"
+CHART_PIE_GRID = "pie_grid"
+CHART_TYPES = (CHART_LINE, CHART_DAILY_PIE, CHART_BAR, CHART_SUMMARY_PIE, CHART_PIE_GRID)
+
+# Processes used to render daily pie charts (None = automatic, 1 = serial)
+PIE_RENDER_WORKERS = None
+# Upper bound for the rendered-chart cache in CHART_OUTPUT_DIR
+CHART_CACHE_MAX_BYTES = 200 * 1024 * 1024
+# Bump whenever a chart's look changes, so cached renders are not reused
+CHART_STYLE_VERSION = 2
+# Small-multiples pie grid: days per page, and grid columns per page
+PIE_GRID_DAYS_PER_PAGE = 24
+PIE_GRID_COLUMNS = 4
+# Gallery thumbnails are this fraction of the full-size chart
+THUMBNAIL_SCALE = 0.4
+# Below this many figures the pool start-up costs more than it saves
+MIN_PARALLEL_FIGURES = 8
+# Line chart resolution: "auto", "day", "week", "month", "year" or "lttb"
+LINE_CHART_RESOLUTION = "auto"
+# "auto" picks the coarsest level that still gives at least this many points
+LINE_CHART_MIN_POINTS = 30
+# "lttb" downsamples the daily series to at most this many points
+LINE_CHART_MAX_POINTS = 200
+
+_plt = None
+_pool = None
+_pool_workers = 0
+
+
+def _pyplot():
+    """Import pyplot on first use, on the non-interactive Agg backend."""
+    global _plt
+    if _plt is None:
+        import matplotlib
+        # Charts are only saved to PNG, never shown, and are drawn off the UI thread
+        matplotlib.use("Agg", force=True)
+        import matplotlib.pyplot as plt
+        _plt = plt
+    return _plt
+
+
+def _init_worker():
+    """Process pool initializer: pay the matplotlib import once per worker."""
+    _pyplot()
+
+
+def save_png(out_path, **kwargs):
+    """
+    plt.savefig() the current figure to out_path atomically, so an interrupted
+    render never leaves a truncated PNG behind (it would look like a cache hit).
+    """
+    plt = _pyplot()
+    tmp_path = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    plt.savefig(tmp_path, format="png", **kwargs)
+    os.replace(tmp_path, out_path)
+
+
+def render_daily_pie(job):
+    """
+    Render one daily pie chart.
+    job is (date_str, labels, sizes, colors, out_path); returns out_path.
+    """
+    d, labels, sizes, colors, out_path = job
+    fig = draw_daily_pie(d, labels, sizes, colors)
+    save_png(out_path, bbox_inches='tight', facecolor="white")
+    _pyplot().close(fig)
+    return out_path
+
+
+def default_worker_count():
+    """Leave one core for the UI, and cap the pool at a sensible size."""
+    return max(1, min(4, (os.cpu_count() or 1) - 1))
+
+
+def _pool_context():
+    """
+    Start method for render workers, or None if parallel rendering is unavailable.
+    "spawn"/"forkserver" workers re-import the app's main module, which opens
+    the Kivy window, so only "fork" (Linux) is used; workers never touch the GUI.
+    """
+    import multiprocessing
+    if sys.platform.startswith("linux") and "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+def _get_pool(workers):
+    """The shared render pool with workers processes, or None if parallel rendering is unavailable."""
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        shutdown_render_pool()
+        context = _pool_context()
+        if context is None:
+            return None
+        from concurrent.futures import ProcessPoolExecutor
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                    initializer=_init_worker)
+        _pool_workers = workers
+    return _pool
+
+
+def shutdown_render_pool():
+    """Stop the shared render pool (it is restarted on demand)."""
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+    _pool = None
+    _pool_workers = 0
+
+
+atexit.register(shutdown_render_pool)
+
+
+def iter_render_jobs(render_func, jobs, workers=None):
+    """
+    Run render_func over jobs, yielding each result in job order as soon as it is ready.
+    Uses a shared process pool when workers > 1 and there are enough jobs;
+    otherwise (or if the pool cannot be used on this platform) renders serially.
+    Closing the generator early cancels the jobs that have not started yet.
+    """
+    jobs = list(jobs)
+    if workers is None:
+        workers = default_worker_count()
+    done = 0
+    if workers > 1 and len(jobs) >= MIN_PARALLEL_FIGURES:
+        from concurrent.futures.process import BrokenProcessPool
+        try:
+            pool = _get_pool(workers)
+            if pool is not None:
+                chunksize = max(1, len(jobs) // (workers * 4))
+                for result in pool.map(render_func, jobs, chunksize=chunksize):
+                    done += 1
+                    yield result
+                return
+        except (BrokenProcessPool, OSError):
+            shutdown_render_pool()
+    # Serial fallback; resumes after whatever the pool already delivered
+    for job in jobs[done:]:
+        yield render_func(job)
+
+
+# ---------------------- Render Cache ----------------------------
+
+
+class RenderCache:
+    """
+    Content-addressed PNG cache with a size-bounded LRU eviction policy.
+    A chart's file name is derived from a hash of everything that affects its
+    pixels (chart type, style version, and the plotted numbers), so an
+    existing file is always a valid render and can be reused as is.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = None     # OrderedDict path -> size, least recent first
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def path_for(self, prefix, *parts):
+        """Cache path for a chart whose content is fully described by parts."""
+        digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"{prefix}_{digest}.png")
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".png"):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.path, stat.st_size))
+        found.sort()
+        self._entries = OrderedDict((path, size) for _, path, size in found)
+        self._total = sum(size for _, _, size in found)
+
+    def lookup(self, path):
+        """True (and mark as recently used) if path is already rendered."""
+        with self._lock:
+            self._load()
+            if path not in self._entries:
+                mornfeels_trace.count("render.cache_misses")
+                return False
+            if not os.path.exists(path):
+                self._total -= self._entries.pop(path)
+                mornfeels_trace.count("render.cache_misses")
+                return False
+            self._entries.move_to_end(path)
+        mornfeels_trace.count("render.cache_hits")
+        try:
+            # Persist recency across sessions
+            os.utime(path)
+        except OSError:
+            pass
+        return True
+
+    def store(self, path):
+        """Record a freshly rendered file and evict the least recently used ones."""
+        with self._lock:
+            self._load()
+            size = os.path.getsize(path)
+            mornfeels_trace.count("render.bytes_written", size)
+            self._total += size - self._entries.pop(path, 0)
+            self._entries[path] = size
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_path, old_size = self._entries.popitem(last=False)
+                self._total -= old_size
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+
+
+# ---------------------- Chart Generation  ----------------------------
+#
+# Each chart type is split into a data step (aggregate -> plotted numbers,
+# which also form the render cache key) and a draw step (numbers -> figure).
+# create_* save the figure as a cached PNG for the gallery; export_pdf()
+# streams the same figures straight into a PDF.
+
+
+_render_cache = None
+
+
+def get_render_cache():
+    """Shared render cache for CHART_OUTPUT_DIR."""
+    global _render_cache
+    if _render_cache is None or _render_cache.directory != mornfeels_core.CHART_OUTPUT_DIR:
+        _render_cache = RenderCache(mornfeels_core.CHART_OUTPUT_DIR, CHART_CACHE_MAX_BYTES)
+    return _render_cache
+
+
+def choose_resolution(aggregate):
+    """
+    The coarsest rollup level that still has LINE_CHART_MIN_POINTS buckets in
+    the aggregate's range, or "day" when even weeks would leave the chart sparse.
+    """
+    dates = aggregate["dates"]
+    if len(dates) < LINE_CHART_MIN_POINTS:
+        return "day"
+    for level in reversed(mornfeels_core.ROLLUP_LEVELS):
+        buckets = {mornfeels_core.bucket_start(d, level) for d in dates}
+        if len(buckets) >= LINE_CHART_MIN_POINTS:
+            return level
+    return "day"
+
+
+def lttb(xs, ys, threshold):
+    """
+    Largest-Triangle-Three-Buckets: indices of at most threshold points of
+    (xs, ys) that keep the visual shape of the line. xs must be increasing.
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third corner of the triangle
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+        ax, ay = xs[a], ys[a]
+        best, best_area = None, -1.0
+        for j in range(int(i * every) + 1, next_start):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def _line_chart_data(aggregate, resolution=None):
+    """
+    (sorted date objects, averages, lows, highs, level) for the line chart.
+    At week/month/year level each point is a rollup bucket, and lows/highs
+    are its min/max; at day level (and "lttb") lows/highs are None.
+    """
+    level = resolution or LINE_CHART_RESOLUTION
+    if level == "auto":
+        level = choose_resolution(aggregate)
+    if level in mornfeels_core.ROLLUP_LEVELS:
+        series = mornfeels_core.Rollups.from_aggregate(aggregate).series(level)
+        return ([datetime.strptime(key, "%Y-%m-%d") for key, *_ in series],
+                [mean for _, mean, _, _, _ in series],
+                [low for _, _, low, _, _ in series],
+                [high for _, _, _, high, _ in series],
+                level)
+    sorted_dates = []
+    averages = []
+    # Convert each date (not each row) into a date object
+    for d_str in aggregate["dates"]:
+        try:
+            d_obj = datetime.strptime(d_str, "%Y-%m-%d")
+        except ValueError:
+            continue
+        # Daily average from the precomputed sums and counts
+        sorted_dates.append(d_obj)
+        averages.append(aggregate["daily_sum"][d_str] / aggregate["daily_count"][d_str])
+    if level == "lttb":
+        keep = lttb([d.toordinal() for d in sorted_dates], averages, LINE_CHART_MAX_POINTS)
+        sorted_dates = [sorted_dates[i] for i in keep]
+        averages = [averages[i] for i in keep]
+    return sorted_dates, averages, None, None, level
+
+
+def _daily_pie_data(aggregate):
+    """[(date, labels, sizes, colors)] for each day that has values."""
+    pies = []
+    for d in aggregate["dates"]:
+        frequency = aggregate["daily_hist"][d]
+        labels, sizes, colors = [], [], []
+        for val in sorted(frequency.keys(), reverse=True):
+            labels.append(str(val))
+            sizes.append(frequency[val])
+            colors.append(MOOD_COLORS.get(val, "grey"))
+        if sizes:
+            pies.append((d, labels, sizes, colors))
+    return pies
+
+
+def _frequency_data(aggregate):
+    """(values, frequencies, colors) over the whole range, highest value first."""
+    frequency = aggregate["hist"]
+    keys = sorted(frequency.keys(), reverse=True)
+    return keys, [frequency[k] for k in keys], [MOOD_COLORS.get(k, "grey") for k in keys]
+
+
+LINE_CHART_TITLES = {"week": "Weekly Average Mood", "month": "Monthly Average Mood",
+                     "year": "Yearly Average Mood"}
+
+
+def draw_line_chart(sorted_dates, averages, lows=None, highs=None, level="day"):
+    plt = _pyplot()
+    import matplotlib.dates as mdates
+    fig = plt.figure(figsize=(6, 4))
+    if lows is not None:
+        # Range of the values within each bucket
+        plt.fill_between(sorted_dates, lows, highs, color="blue", alpha=0.15, linewidth=0)
+    # Markers only while they stay distinguishable
+    plt.plot(sorted_dates, averages, marker='o' if len(averages) <= 120 else None, color="blue")
+    plt.title(LINE_CHART_TITLES.get(level, "Daily Average Mood"))
+    plt.xlabel("Date")
+    plt.ylabel("Average Mood")
+
+    # Configure x-axis to handle dates
+    ax = plt.gca()
+    # Use an automatic date locator (reduces overlap by limiting ticks)
+    ax.xaxis.set_major_locator(mdates.AutoDateLocator(maxticks=10))
+    # Format the dates in a short format, e.g. "Jan-01" ("2024-01" / "2024" for long ranges)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter(
+        {"month": "%Y-%m", "year": "%Y"}.get(level, '%b-%d')))
+
+    # Rotate and reduce font size to avoid overlap
+    plt.xticks(rotation=45, fontsize=8)
+    plt.tight_layout()
+    return fig
+
+
+def draw_daily_pie(d, labels, sizes, colors):
+    plt = _pyplot()
+    # Ensure a white background
+    fig = plt.figure(figsize=(5, 3), facecolor="white")
+    plt.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%')
+    plt.title(f"Pie Chart for {d}")
+    return fig
+
+
+def draw_pie_grid(pies, page, pages, columns=None):
+    """
+    Small multiples: one pie per day in a grid on a single figure, sharing
+    the MOOD_COLORS legend instead of per-pie labels.
+    """
+    plt = _pyplot()
+    from matplotlib.patches import Patch
+    columns = min(columns or PIE_GRID_COLUMNS, len(pies))
+    rows = -(-len(pies) // columns)
+    fig, axes = plt.subplots(rows, columns, figsize=(1.6 * columns + 0.4, 1.6 * rows + 0.9),
+                             facecolor="white", squeeze=False)
+    values = set()
+    for ax, (d, labels, sizes, colors) in zip(axes.flat, pies):
+        ax.pie(sizes, colors=colors, startangle=90, counterclock=False)
+        ax.set_title(d, fontsize=8)
+        values.update(int(label) for label in labels)
+    for ax in axes.flat[len(pies):]:
+        ax.axis("off")
+    handles = [Patch(color=MOOD_COLORS.get(v, "grey"), label=str(v)) for v in sorted(values, reverse=True)]
+    fig.legend(handles=handles, loc="lower center", ncol=len(handles), fontsize=8, frameon=False)
+    title = "Daily Mood Distribution"
+    if pages > 1:
+        title += f" ({page}/{pages})"
+    fig.suptitle(title)
+    fig.tight_layout(rect=(0, 0.06, 1, 1))
+    return fig
+
+
+def draw_bar_chart(keys, values, colors):
+    plt = _pyplot()
+    fig = plt.figure(figsize=(5, 3))
+    plt.bar([str(k) for k in keys], values, color=colors)
+    plt.title("Bar Chart Example")
+    return fig
+
+
+def draw_summary_pie(keys, sizes, colors):
+    plt = _pyplot()
+    fig = plt.figure(figsize=(5, 3))
+    plt.pie(sizes, labels=[str(k) for k in keys], colors=colors, autopct='%1.1f%%')
+    plt.title("Summary Pie Chart")
+    return fig
+
+
+def _save_cached(cache, out_path, fig):
+    save_png(out_path, bbox_inches='tight', facecolor=fig.get_facecolor())
+    _pyplot().close(fig)
+    cache.store(out_path)
+    mornfeels_trace.count("render.figures")
+    return out_path
+
+
+def create_line_chart(aggregate, resolution=None):
+    """
+    Create the average-mood line chart and return the PNG path.
+    resolution: see LINE_CHART_RESOLUTION (None = that default). Long ranges
+    are drawn from weekly/monthly/yearly rollups, so render time stays flat.
+    """
+    aggregate = mornfeels_core.as_aggregate(aggregate)
+    data = _line_chart_data(aggregate, resolution)
+    # The plotted numbers fully determine the image, so reuse an earlier render
+    cache = get_render_cache()
+    out_path = cache.path_for("line_chart", "line", CHART_STYLE_VERSION, *data)
+    if cache.lookup(out_path):
+        return out_path
+    with mornfeels_trace.span("render.line_chart"):
+        return _save_cached(cache, out_path, draw_line_chart(*data))
+
+
+def create_daily_pie_charts(aggregate, workers=None):
+    """
+    Create one pie chart per day and return the PNG paths in date order.
+    workers: render processes to use (None = PIE_RENDER_WORKERS, 1 = serial).
+    """
+    return list(iter_daily_pie_charts(aggregate, workers))
+
+
+def iter_daily_pie_charts(aggregate, workers=None):
+    """Like create_daily_pie_charts(), but yields each path as soon as it is saved."""
+    aggregate = mornfeels_core.as_aggregate(aggregate)
+    if workers is None:
+        workers = PIE_RENDER_WORKERS
+
+    cache = get_render_cache()
+    jobs = []
+    for d, labels, sizes, colors in _daily_pie_data(aggregate):
+        date_tag = d.replace("-", "")
+        out_path = cache.path_for(f"pie_{date_tag}", "pie", CHART_STYLE_VERSION,
+                                  d, labels, sizes, colors)
+        jobs.append((d, labels, sizes, colors, out_path))
+
+    # Past days never change, so most pies are cache hits; render only the rest
+    hits = [cache.lookup(job[-1]) for job in jobs]
+    misses = [job for job, hit in zip(jobs, hits) if not hit]
+    # Each day is an independent figure: render them in parallel, in order
+    rendered = iter_render_jobs(render_daily_pie, misses, workers=workers)
+    try:
+        for job, hit in zip(jobs, hits):
+            if hit:
+                yield job[-1]
+            else:
+                # Time spent waiting for the pool (or rendering, when serial)
+                with mornfeels_trace.span("render.daily_pie"):
+                    out_path = next(rendered)
+                cache.store(out_path)
+                mornfeels_trace.count("render.figures")
+                yield out_path
+    finally:
+        rendered.close()
+
+
+def _pie_grid_pages(aggregate, days_per_page=None):
+    per_page = days_per_page or PIE_GRID_DAYS_PER_PAGE
+    pies = _daily_pie_data(aggregate)
+    return [pies[i:i + per_page] for i in range(0, len(pies), per_page)]
+
+
+def create_pie_grid_charts(aggregate, days_per_page=None):
+    """
+    Draw every day of the range as a small pie on a few paginated figures
+    (days_per_page per figure, default PIE_GRID_DAYS_PER_PAGE) instead of one
+    figure per day. Returns the PNG paths, one per page.
+    """
+    aggregate = mornfeels_core.as_aggregate(aggregate)
+    pages = _pie_grid_pages(aggregate, days_per_page)
+    cache = get_render_cache()
+    paths = []
+    for number, pies in enumerate(pages, start=1):
+        out_path = cache.path_for(f"pie_grid_{pies[0][0].replace('-', '')}", "pie_grid",
+                                  CHART_STYLE_VERSION, PIE_GRID_COLUMNS, number, len(pages), pies)
+        if not cache.lookup(out_path):
+            with mornfeels_trace.span("render.pie_grid"):
+                _save_cached(cache, out_path, draw_pie_grid(pies, number, len(pages)))
+        paths.append(out_path)
+    return paths
+
+
+def create_bar_chart(aggregate):
+    """Create a bar chart and return the PNG path."""
+    # Overall frequencies come from the shared aggregate
+    keys, values, colors = _frequency_data(mornfeels_core.as_aggregate(aggregate))
+    cache = get_render_cache()
+    out_path = cache.path_for("bar_chart", "bar", CHART_STYLE_VERSION, keys, values, colors)
+    if cache.lookup(out_path):
+        return out_path
+    with mornfeels_trace.span("render.bar_chart"):
+        return _save_cached(cache, out_path, draw_bar_chart(keys, values, colors))
+
+
+def create_summary_pie_chart(aggregate):
+    """Create a summary pie chart and return the PNG path."""
+    keys, sizes, colors = _frequency_data(mornfeels_core.as_aggregate(aggregate))
+    cache = get_render_cache()
+    out_path = cache.path_for("summary_pie", "summary_pie", CHART_STYLE_VERSION, keys, sizes, colors)
+    if cache.lookup(out_path):
+        return out_path
+    with mornfeels_trace.span("render.summary_pie"):
+        return _save_cached(cache, out_path, draw_summary_pie(keys, sizes, colors))
+
+
+def count_charts(aggregate, chart_types):
+    """Number of PNGs iter_charts() will produce for these chart types."""
+    total = 0
+    for chart_type in chart_types:
+        if chart_type == CHART_DAILY_PIE:
+            total += len(aggregate["dates"])
+        elif chart_type == CHART_PIE_GRID:
+            total += -(-len(aggregate["dates"]) // PIE_GRID_DAYS_PER_PAGE)
+        else:
+            total += 1
+    return total
+
+
+def iter_charts(aggregate, chart_types, workers=None):
+    """Render the given chart types (CHART_*) in order, yielding each PNG path."""
+    for chart_type in chart_types:
+        if chart_type == CHART_LINE:
+            yield create_line_chart(aggregate)
+        elif chart_type == CHART_DAILY_PIE:
+            yield from iter_daily_pie_charts(aggregate, workers)
+        elif chart_type == CHART_BAR:
+            yield create_bar_chart(aggregate)
+        elif chart_type == CHART_SUMMARY_PIE:
+            yield create_summary_pie_chart(aggregate)
+        elif chart_type == CHART_PIE_GRID:
+            yield from create_pie_grid_charts(aggregate)
+        else:
+            raise ValueError(f"Unknown chart type: {chart_type}")
+
+
+def iter_chart_figures(aggregate, chart_types):
+    """
+    Draw the given chart types in order and yield each matplotlib figure,
+    without writing anything to disk. The caller must close each figure.
+    """
+    aggregate = mornfeels_core.as_aggregate(aggregate)
+    for chart_type in chart_types:
+        if chart_type == CHART_LINE:
+            yield draw_line_chart(*_line_chart_data(aggregate))
+        elif chart_type == CHART_DAILY_PIE:
+            for pie in _daily_pie_data(aggregate):
+                yield draw_daily_pie(*pie)
+        elif chart_type == CHART_BAR:
+            yield draw_bar_chart(*_frequency_data(aggregate))
+        elif chart_type == CHART_SUMMARY_PIE:
+            yield draw_summary_pie(*_frequency_data(aggregate))
+        elif chart_type == CHART_PIE_GRID:
+            pages = _pie_grid_pages(aggregate)
+            for number, pies in enumerate(pages, start=1):
+                yield draw_pie_grid(pies, number, len(pages))
+        else:
+            raise ValueError(f"Unknown chart type: {chart_type}")
+
+
+# ---------------------- Thumbnails ----------------------------
+
+
+def thumbnail_path(image_path):
+    """Where make_thumbnail() puts the thumbnail of image_path."""
+    return os.path.splitext(image_path)[0] + ".thumb.png"
+
+
+def make_thumbnail(image_path):
+    """
+    Write (once) a THUMBNAIL_SCALE copy of a rendered chart for the gallery and
+    return its path. Chart files are content-addressed, so an existing
+    thumbnail is always up to date.
+    """
+    thumb_path = thumbnail_path(image_path)
+    cache = get_render_cache()
+    if cache.lookup(thumb_path):
+        return thumb_path
+    _pyplot()
+    from matplotlib.image import thumbnail
+    tmp_path = f"{thumb_path}.{os.getpid()}.{threading.get_ident()}.tmp.png"
+    with mornfeels_trace.span("render.thumbnail"):
+        thumbnail(image_path, tmp_path, scale=THUMBNAIL_SCALE)
+    os.replace(tmp_path, thumb_path)
+    cache.store(thumb_path)
+    return thumb_path
+
+
+# ---------------------- PDF Export ----------------------------
+
+
+def _new_pdf():
+    from fpdf import FPDF  # pip install fpdf2 (fpdf 1.x works too)
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=10)
+    return pdf
+
+
+def _fpdf_reads_buffers():
+    """fpdf2 accepts file-like images; classic fpdf 1.x only reads image files."""
+    import fpdf
+    try:
+        return int(str(getattr(fpdf, "FPDF_VERSION", "1")).split(".")[0]) >= 2
+    except ValueError:
+        return False
+
+
+def generate_pdf_from_images(image_paths, output_pdf):
+    """Combine the given PNG images into a PDF using FPDF."""
+    with mornfeels_trace.span("pdf.images"):
+        pdf = _new_pdf()
+        for img_path in image_paths:
+            pdf.add_page()
+            pdf.image(img_path, x=10, y=10, w=180)
+        pdf.output(output_pdf, "F")
+    _count_pdf(output_pdf, len(image_paths))
+
+
+def _count_pdf(output_pdf, pages):
+    if mornfeels_trace.enabled():
+        mornfeels_trace.count("pdf.pages", pages)
+        mornfeels_trace.count("pdf.bytes_written", os.path.getsize(output_pdf))
+
+
+def export_pdf(aggregate, chart_types, output_pdf, vector=False):
+    """
+    Render the charts straight into output_pdf, without intermediate PNG files.
+    vector=True embeds them as vector graphics via matplotlib's PDF backend
+    (smaller and sharper, no FPDF needed). Otherwise each figure is encoded to
+    an in-memory PNG and placed like generate_pdf_from_images() does; only
+    fpdf2 takes those buffers directly, fpdf 1.x gets them through a
+    temporary directory.
+    Returns the number of charts written.
+    """
+    with mornfeels_trace.span("pdf.vector" if vector else "pdf.export"):
+        count = _write_pdf(aggregate, chart_types, output_pdf, vector)
+    _count_pdf(output_pdf, count)
+    return count
+
+
+def _write_pdf(aggregate, chart_types, output_pdf, vector):
+    plt = _pyplot()
+    count = 0
+    if vector:
+        from matplotlib.backends.backend_pdf import PdfPages
+        with PdfPages(output_pdf) as pages:
+            for fig in iter_chart_figures(aggregate, chart_types):
+                pages.savefig(fig, bbox_inches='tight')
+                plt.close(fig)
+                count += 1
+        return count
+
+    pdf = _new_pdf()
+    spool_dir = None
+    if not _fpdf_reads_buffers():
+        # Classic fpdf needs a file name, so buffers are spooled to a temp dir
+        import tempfile
+        spool_dir = tempfile.TemporaryDirectory(prefix="mornfeels_pdf_")
+    try:
+        for fig in iter_chart_figures(aggregate, chart_types):
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format="png", bbox_inches='tight', facecolor=fig.get_facecolor())
+            plt.close(fig)
+            pdf.add_page()
+            if spool_dir is None:
+                buffer.seek(0)
+                pdf.image(buffer, x=10, y=10, w=180)
+            else:
+                img_path = os.path.join(spool_dir.name, f"chart_{count}.png")
+                with open(img_path, mode="wb") as f:
+                    f.write(buffer.getbuffer())
+                pdf.image(img_path, x=10, y=10, w=180)
+            count += 1
+        pdf.output(output_pdf, "F")
+    finally:
+        if spool_dir is not None:
+            spool_dir.cleanup()
+    return count
@@ -0,0 +1,491 @@
+"""
+Command-line tools for Mornfeels. Runs headless: no Kivy, no tkinter.
+
+Batch reports (charts + PDF) for many journals and date ranges at once:
+
+    python mornfeels_cli.py report journal_a.csv journal_b.csv --period month
+    python mornfeels_cli.py report mornfeels_data.csv --range 2025-01-01:2025-01-31 --range 2025-02-01:2025-02-28
+
+One-shot migration of a CSV journal to the SQLite or monthly-partitioned backend:
+
+    python mornfeels_cli.py migrate mornfeels_data.csv mornfeels.db
+    python mornfeels_cli.py migrate mornfeels_data.csv mornfeels_data/
+
+Bulk import from another tracker or a phone sync (CSV or JSON Lines), skipping
+entries whose date and time are already in the journal:
+
+    python mornfeels_cli.py import mornfeels_data.csv export.csv synced.jsonl
+
+Streaming export to gzip CSV, JSON Lines or (with pyarrow) Parquet:
+
+    python mornfeels_cli.py export mornfeels_data.csv history.csv.gz --range 2020-01-01:2024-12-31
+
+Compress closed months of a CSV journal into checksummed segments:
+
+    python mornfeels_cli.py compact mornfeels_data.csv --codec lzma
+
+Entries whose note mentions some words (as prefixes), with their mood statistics:
+
+    python mornfeels_cli.py search mornfeels_data.csv "coffee work" --range 2025-01-01:2025-06-30 --pdf coffee.pdf
+
+Weekly, monthly or yearly mean/min/max/count of a journal:
+
+    python mornfeels_cli.py rollups mornfeels_data.csv --level month
+
+Rolling averages, mood by hour of day and per-day/week/month mean and spread:
+
+    python mornfeels_cli.py stats mornfeels_data.csv --level week --start 2025-01-01
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+
+import mornfeels_core
+import mornfeels_charts
+import mornfeels_trace
+
+DEFAULT_REPORT_CHARTS = (mornfeels_charts.CHART_LINE, mornfeels_charts.CHART_BAR,
+                         mornfeels_charts.CHART_SUMMARY_PIE)
+
+
+# ---------------------- Argument Helpers ----------------------------
+
+
+def _parse_date(text):
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date {text!r}, expected YYYY-MM-DD")
+
+
+def parse_range(text):
+    """"START:END" (inclusive) or a single "DATE" -> (start, end)."""
+    start, _, end = text.partition(":")
+    start = _parse_date(start)
+    end = _parse_date(end) if end else start
+    if end < start:
+        raise argparse.ArgumentTypeError(f"range {text!r} ends before it starts")
+    return start, end
+
+
+def parse_values(text):
+    """"0,1,2" -> {0, 1, 2}."""
+    try:
+        return {int(part) for part in text.split(",") if part.strip()}
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid mood values {text!r}, expected e.g. 0,1,2")
+
+
+def parse_chart_types(text):
+    chart_types = [name.strip() for name in text.split(",") if name.strip()]
+    for name in chart_types:
+        if name not in mornfeels_charts.CHART_TYPES:
+            raise argparse.ArgumentTypeError(
+                f"unknown chart type {name!r} (choose from {', '.join(mornfeels_charts.CHART_TYPES)})")
+    return chart_types
+
+
+def period_ranges(dates, period):
+    """
+    Calendar weeks (Monday-Sunday) or months that contain at least one of
+    the given YYYY-MM-DD dates, as sorted (start, end) pairs.
+    """
+    starts = set()
+    for d_str in dates:
+        try:
+            d = datetime.strptime(d_str, "%Y-%m-%d").date()
+        except ValueError:
+            continue
+        if period == "week":
+            starts.add(d - timedelta(days=d.weekday()))
+        else:
+            starts.add(d.replace(day=1))
+    ranges = []
+    for start in sorted(starts):
+        if period == "week":
+            end = start + timedelta(days=6)
+        else:
+            end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        ranges.append((start.isoformat(), end.isoformat()))
+    return ranges
+
+
+# ---------------------- Report Workers ----------------------------
+
+
+# Journals parsed by this (worker) process, reused across its batches
+_journals = {}
+
+
+def _init_report_worker(chart_dir, trace=False):
+    mornfeels_core.CHART_OUTPUT_DIR = chart_dir
+    if trace:
+        mornfeels_trace.enable()
+
+
+def run_report_batch(batch):
+    """
+    Render the reports for one journal and a list of date ranges.
+    batch is (data_path, report_name, ranges, chart_types, output_dir, pdf_mode).
+    Returns [(start, end, pdf_path or None, chart_count)].
+    """
+    data_path, report_name, ranges, chart_types, output_dir, pdf_mode = batch
+    journal = _journals.get(data_path)
+    if journal is None:
+        journal = _journals[data_path] = mornfeels_core.Journal(data_path)
+    results = []
+    for start, end in ranges:
+        aggregate = journal.aggregate(start, end)
+        if not aggregate["dates"]:
+            results.append((start, end, None, 0))
+            continue
+        pdf_path = os.path.join(output_dir, f"{report_name}_{start}_{end}.pdf")
+        if pdf_mode == "files":
+            # One process per batch already; never nest a render pool inside it
+            paths = list(mornfeels_charts.iter_charts(aggregate, chart_types, workers=1))
+            mornfeels_charts.generate_pdf_from_images(paths, output_pdf=pdf_path)
+            chart_count = len(paths)
+        else:
+            chart_count = mornfeels_charts.export_pdf(aggregate, chart_types, pdf_path,
+                                                      vector=pdf_mode == "vector")
+        results.append((start, end, pdf_path, chart_count))
+    return results
+
+
+def run_traced_report_batch(batch):
+    """run_report_batch() in a worker process, plus the trace of just this batch."""
+    mornfeels_trace.reset()
+    results = run_report_batch(batch)
+    return results, mornfeels_trace.snapshot()
+
+
+def _report_names(data_paths):
+    """File stem per journal, made unique if two journals share a name."""
+    names, seen = [], {}
+    for path in data_paths:
+        stem = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        names.append(stem if seen[stem] == 1 else f"{stem}_{seen[stem]}")
+    return names
+
+
+def _split(items, parts):
+    size = max(1, -(-len(items) // parts))
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def cmd_report(args):
+    started = time.perf_counter()
+    os.makedirs(args.output_dir, exist_ok=True)
+    chart_dir = args.chart_dir or os.path.join(args.output_dir, "charts")
+    jobs = args.jobs or os.cpu_count() or 1
+
+    batches = []
+    for data_path, name in zip(args.data_files, _report_names(args.data_files)):
+        if not os.path.exists(data_path):
+            print(f"error: {data_path} not found", file=sys.stderr)
+            return 2
+        ranges = list(args.ranges or [])
+        if args.period:
+            ranges += period_ranges(mornfeels_core.get_storage(data_path).unique_dates(), args.period)
+        # Ranges of one journal are grouped so each worker parses it only once
+        for part in _split(ranges, jobs):
+            batches.append((data_path, name, part, args.charts, args.output_dir, args.pdf_mode))
+    if not batches:
+        print("error: no date ranges given (use --range or --period)", file=sys.stderr)
+        return 2
+
+    if args.trace:
+        mornfeels_trace.enable()
+    if jobs > 1 and len(batches) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_report_worker,
+                                 initargs=(chart_dir, bool(args.trace))) as pool:
+            if args.trace:
+                batch_results = []
+                for results, trace in pool.map(run_traced_report_batch, batches):
+                    mornfeels_trace.merge(trace)
+                    batch_results.append(results)
+            else:
+                batch_results = list(pool.map(run_report_batch, batches))
+    else:
+        _init_report_worker(chart_dir)
+        batch_results = [run_report_batch(batch) for batch in batches]
+
+    reports = 0
+    for (data_path, *_), results in zip(batches, batch_results):
+        for start, end, pdf_path, chart_count in results:
+            if pdf_path is None:
+                print(f"{data_path} {start}..{end}: no entries, skipped")
+            else:
+                reports += 1
+                print(f"{pdf_path} ({chart_count} charts)")
+    elapsed = time.perf_counter() - started
+    print(f"Generated {reports} reports in {elapsed:.1f} s")
+    if args.trace:
+        mornfeels_trace.write_report(args.trace)
+    return 0
+
+
+def cmd_migrate(args):
+    if not os.path.exists(args.csv_file):
+        print(f"error: {args.csv_file} not found", file=sys.stderr)
+        return 2
+    started = time.perf_counter()
+    try:
+        if args.target.lower().endswith(mornfeels_core.SQLITE_SUFFIXES):
+            copied = mornfeels_core.migrate_csv_to_sqlite(args.csv_file, args.target)
+        else:
+            copied = mornfeels_core.migrate_csv_to_partitions(args.csv_file, args.target)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    elapsed = time.perf_counter() - started
+    print(f"Copied {copied} entries to {args.target} in {elapsed:.1f} s")
+    return 0
+
+
+def cmd_import(args):
+    import mornfeels_import
+    started = time.perf_counter()
+    imported = 0
+    for input_path in args.inputs:
+        try:
+            stats = mornfeels_import.import_file(input_path, args.data_file, args.format,
+                                                 max(1, args.batch_size))
+        except (OSError, mornfeels_import.ImportInputError) as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 2
+        for message in stats["errors"]:
+            print(f"{input_path}: {message}", file=sys.stderr)
+        print(f"{input_path}: {stats['imported']} imported, {stats['duplicates']} duplicates, "
+              f"{stats['invalid']} invalid")
+        imported += stats["imported"]
+    elapsed = time.perf_counter() - started
+    print(f"Imported {imported} entries into {args.data_file} in {elapsed:.1f} s")
+    return 0
+
+
+def cmd_export(args):
+    import mornfeels_export
+    storage = mornfeels_core.get_storage(args.data_file)
+    if not storage.exists():
+        print(f"error: {args.data_file} not found", file=sys.stderr)
+        return 2
+    if args.range:
+        start, end = args.range
+    else:
+        dates = storage.unique_dates()
+        if not dates:
+            print("error: the journal has no entries", file=sys.stderr)
+            return 2
+        start, end = dates[0], dates[-1]
+    started = time.perf_counter()
+    try:
+        written = mornfeels_export.export(args.output, start, end, args.data_file, args.format,
+                                          args.gzip or None, args.values)
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    elapsed = time.perf_counter() - started
+    print(f"Exported {written} entries ({start}..{end}) to {args.output} in {elapsed:.1f} s")
+    return 0
+
+
+def _footprint(data_path):
+    total = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+    segments_dir = data_path + mornfeels_core.SEGMENTS_SUFFIX
+    if os.path.isdir(segments_dir):
+        total += sum(entry.stat().st_size for entry in os.scandir(segments_dir) if entry.is_file())
+    return total
+
+
+def cmd_compact(args):
+    import mornfeels_segments
+    if not os.path.isfile(args.data_file):
+        print(f"error: {args.data_file} not found", file=sys.stderr)
+        return 2
+    before = _footprint(args.data_file)
+    try:
+        moved = mornfeels_segments.compact(args.data_file, args.codec, args.before)
+    except mornfeels_segments.SegmentError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    if not moved:
+        print("Nothing to compact")
+        return 0
+    after = _footprint(args.data_file)
+    print(f"Compacted {sum(moved.values())} entries of {len(moved)} months: "
+          f"{before / 1024:.0f} KiB -> {after / 1024:.0f} KiB")
+    return 0
+
+
+def cmd_rollups(args):
+    if not mornfeels_core.get_storage(args.data_file).exists():
+        print(f"error: {args.data_file} not found", file=sys.stderr)
+        return 2
+    rollups = mornfeels_core.get_rollups(args.data_file)
+    print(f"{args.level:<10} {'mean':>6} {'min':>4} {'max':>4} {'count':>7}")
+    for key, mean, low, high, count in rollups.series(args.level, args.start, args.end):
+        print(f"{key:<10} {mean:>6.2f} {low:>4} {high:>4} {count:>7}")
+    return 0
+
+
+def cmd_search(args):
+    if not mornfeels_core.get_storage(args.data_file).exists():
+        print(f"error: {args.data_file} not found", file=sys.stderr)
+        return 2
+    start, end = args.range or (None, None)
+    matches = mornfeels_core.search_notes(args.query, start, end, args.values, args.data_file)
+    rows = list(matches.rows())
+    for d, t, value, note in rows[-args.limit:] if args.limit else rows:
+        print(f"{d} {t} {value:>2}  {note}")
+    if not rows:
+        print("No matching entries")
+        return 0
+    aggregate = matches.aggregate()
+    mean = sum(aggregate["daily_sum"].values()) / len(rows)
+    hist = " ".join(f"{val}:{n}" for val, n in sorted(aggregate["hist"].items()))
+    print(f"{len(rows)} entries on {len(aggregate['dates'])} days, mean mood {mean:.2f} ({hist})")
+    if args.pdf:
+        charts = mornfeels_charts.export_pdf(aggregate, args.charts, args.pdf)
+        print(f"{args.pdf} ({charts} charts)")
+    return 0
+
+
+def cmd_stats(args):
+    if not mornfeels_core.get_storage(args.data_file).exists():
+        print(f"error: {args.data_file} not found", file=sys.stderr)
+        return 2
+    statistics = mornfeels_core.get_statistics(args.data_file)
+    for window in mornfeels_core.ROLLING_WINDOWS:
+        mean, count = statistics.rolling_mean(window, args.end)
+        average = f"{mean:.2f}" if count else "-"
+        print(f"{window}-day average: {average} ({count} entries)")
+    print()
+    print(f"{'hour':<10} {'mean':>6} {'std':>6} {'count':>7}")
+    for hour, count, mean, std in statistics.hour_profile():
+        print(f"{hour:02d}:00      {mean:>6.2f} {std:>6.2f} {count:>7}")
+    if args.level:
+        print()
+        print(f"{args.level:<10} {'mean':>6} {'std':>6} {'count':>7}")
+        for key, count, mean, std in statistics.series(args.level, args.start, args.end):
+            print(f"{key:<10} {mean:>6.2f} {std:>6.2f} {count:>7}")
+    return 0
+
+
+# ---------------------- Entry Point ----------------------------
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="mornfeels_cli.py", description=__doc__.split("\n\n")[0].strip())
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    report = commands.add_parser("report", help="generate chart PDFs for date ranges")
+    report.add_argument("data_files", nargs="+", metavar="DATA_CSV",
+                        help="one or more mood journals (Date;Time;Value;Note CSV, SQLite .db "
+                             "or partition directory)")
+    report.add_argument("--range", dest="ranges", action="append", type=parse_range,
+                        metavar="START:END", help="inclusive date range (repeatable)")
+    report.add_argument("--period", choices=("week", "month"),
+                        help="one report per calendar week/month that has entries")
+    report.add_argument("--charts", type=parse_chart_types, default=list(DEFAULT_REPORT_CHARTS),
+                        help="comma-separated chart types (default: line,bar,summary_pie)")
+    report.add_argument("--output-dir", default="reports", help="where PDFs are written")
+    report.add_argument("--pdf-mode", choices=("memory", "vector", "files"), default="memory",
+                        help="memory: PNGs rendered in memory (default; with fpdf 1.x "
+                             "they are spooled to a temp dir, use fpdf2 to avoid disk); "
+                             "vector: vector graphics, no PNGs; files: cached PNG files, "
+                             "as in the app")
+    report.add_argument("--chart-dir", help="chart render cache for --pdf-mode files "
+                                            "(default: OUTPUT_DIR/charts)")
+    report.add_argument("--jobs", type=int, default=0,
+                        help="worker processes (default: number of CPUs)")
+    report.add_argument("--trace", nargs="?", const="-", metavar="FILE",
+                        help="record stage timings and counters; print a summary to stderr, "
+                             "or write it to FILE (.json for JSON)")
+    report.set_defaults(func=cmd_report)
+
+    migrate = commands.add_parser("migrate", help="copy a CSV journal into a new SQLite database "
+                                                  "or monthly partition directory")
+    migrate.add_argument("csv_file", help="existing Date;Time;Value;Note CSV")
+    migrate.add_argument("target", help="SQLite database to create (.db, .sqlite or .sqlite3), "
+                                        "or a directory for monthly partitions")
+    migrate.set_defaults(func=cmd_migrate)
+
+    bulk = commands.add_parser("import", help="append entries from CSV or JSON Lines files, "
+                                              "skipping ones already in the journal")
+    bulk.add_argument("data_file", help="mood journal to import into (CSV, SQLite .db or "
+                                        "partition directory); created if missing")
+    bulk.add_argument("inputs", nargs="+", metavar="INPUT",
+                      help="CSV (; or , separated) or JSON Lines (.jsonl) files")
+    bulk.add_argument("--format", choices=("csv", "jsonl"),
+                      help="input format (default: from each file's suffix)")
+    bulk.add_argument("--batch-size", type=int, default=10000,
+                      help="entries validated and written per batch (default: 10000)")
+    bulk.set_defaults(func=cmd_import)
+
+    export = commands.add_parser("export", help="stream entries to gzip CSV, JSON Lines or Parquet")
+    export.add_argument("data_file", help="mood journal (CSV, SQLite .db or partition directory)")
+    export.add_argument("output", help="file to write; the format follows its name "
+                                       "(.csv, .jsonl, .parquet, plus .gz to compress)")
+    export.add_argument("--range", type=parse_range, metavar="START:END",
+                        help="inclusive date range (default: the whole journal)")
+    export.add_argument("--values", type=parse_values, metavar="V,V,...",
+                        help="only entries with one of these mood values")
+    export.add_argument("--format", choices=("csv", "jsonl", "parquet"),
+                        help="output format (default: from the output name)")
+    export.add_argument("--gzip", action="store_true",
+                        help="gzip the CSV or JSON Lines output whatever its name")
+    export.set_defaults(func=cmd_export)
+
+    compact = commands.add_parser("compact", help="move closed months of a CSV journal into "
+                                                  "compressed segments")
+    compact.add_argument("data_file", help="Date;Time;Value;Note CSV")
+    compact.add_argument("--codec", choices=("zlib", "lzma"), default="zlib",
+                         help="lzma is smaller, zlib is faster to read (default: zlib)")
+    compact.add_argument("--before", metavar="YYYY-MM",
+                         help="compact months before this one (default: the current month)")
+    compact.set_defaults(func=cmd_compact)
+
+    search = commands.add_parser("search", help="find entries by the words of their notes")
+    search.add_argument("data_file", help="mood journal (CSV, SQLite .db or partition directory)")
+    search.add_argument("query", help="words the note must contain (each matches as a prefix)")
+    search.add_argument("--range", type=parse_range, metavar="START:END",
+                        help="only entries in this inclusive date range")
+    search.add_argument("--values", type=parse_values, metavar="V,V,...",
+                        help="only entries with one of these mood values")
+    search.add_argument("--limit", type=int, default=20,
+                        help="print at most the last N entries, 0 for all (default: 20)")
+    search.add_argument("--pdf", help="also write the charts of the matching entries to this PDF")
+    search.add_argument("--charts", type=parse_chart_types, default=list(DEFAULT_REPORT_CHARTS),
+                        help="comma-separated chart types for --pdf (default: line,bar,summary_pie)")
+    search.set_defaults(func=cmd_search)
+
+    rollups = commands.add_parser("rollups", help="print weekly/monthly/yearly mood statistics")
+    rollups.add_argument("data_file", help="mood journal (CSV, SQLite .db or partition directory)")
+    rollups.add_argument("--level", choices=mornfeels_core.ROLLUP_LEVELS, default="month")
+    rollups.add_argument("--start", type=_parse_date, help="first date (YYYY-MM-DD)")
+    rollups.add_argument("--end", type=_parse_date, help="last date (YYYY-MM-DD)")
+    rollups.set_defaults(func=cmd_rollups)
+
+    stats = commands.add_parser("stats", help="print rolling averages and mood by hour of day")
+    stats.add_argument("data_file", help="mood journal (CSV, SQLite .db or partition directory)")
+    stats.add_argument("--level", choices=mornfeels_core.STATISTICS_LEVELS,
+                       help="also print the mean and standard deviation per day, week or month")
+    stats.add_argument("--start", type=_parse_date, help="first date for --level (YYYY-MM-DD)")
+    stats.add_argument("--end", type=_parse_date,
+                       help="last date; the rolling averages end here (default: today)")
+    stats.set_defaults(func=cmd_stats)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
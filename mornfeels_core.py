@@ -0,0 +1,1770 @@
+"""
+GUI-free core of Mornfeels: data storage, settings and analysis.
+
+Imports only the standard library (plus the stdlib-only mornfeels_trace), so
+it loads in milliseconds and can be used without Kivy, matplotlib or fpdf
+(e.g. to log an entry or in scripts).
+"""
+import os
+import csv
+import io
+import re
+import json
+import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+import mornfeels_trace
+
+DATA_CSV = "mornfeels_data.csv"
+DATA_SQLITE = "mornfeels.db"
+# Directory of monthly partition files for the "partitioned" backend
+DATA_DIR = "mornfeels_data"
+# Storage backend for the app's own data: "csv", "sqlite" or "partitioned"
+STORAGE_BACKEND = "csv"
+SETTINGS_FILE = "settings.csv"
+CHART_OUTPUT_DIR = "generated_charts"
+# Use the NumPy backend for aggregation when it is available
+USE_NUMPY_BACKEND = True
+DATE_INDEX_SUFFIX = ".idx"
+# Largest piece of a data CSV read at once when streaming a date range
+READ_BLOCK_BYTES = 1 << 20
+ROLLUPS_SUFFIX = ".rollups.json"
+NOTE_INDEX_SUFFIX = ".notes.json"
+STATISTICS_SUFFIX = ".stats.json"
+# Batches saved since the note index / statistics sidecar was written, one JSON line each
+NOTE_LOG_SUFFIX = ".notes.log"
+STATISTICS_LOG_SUFFIX = ".stats.log"
+# Logged entries after which a sidecar is rewritten and its log emptied
+SIDECAR_LOG_MAX_ROWS = 1000
+# Directory of compressed monthly segments next to a compacted data CSV
+SEGMENTS_SUFFIX = ".segments"
+# Lock file serializing appends to a data CSV with compaction replacing it
+LOCK_SUFFIX = ".lock"
+
+# ---------------------- CSV and Settings Functions ----------------------------
+#
+# The entry functions below go through a storage backend (see Storage
+# Backends): the original CSV file, a SQLite database when the data path
+# ends in .db/.sqlite/.sqlite3, or monthly CSV partitions when it is a
+# directory (STORAGE_BACKEND selects which one the app uses).
+
+def default_data_path():
+    """The data file (or directory) the app uses for STORAGE_BACKEND."""
+    if STORAGE_BACKEND == "sqlite":
+        return DATA_SQLITE
+    if STORAGE_BACKEND == "partitioned":
+        return DATA_DIR
+    return DATA_CSV
+
+
+def init_csv(file_path):
+    """Create the data file (CSV with headers, or SQLite schema) if it does not exist."""
+    get_storage(file_path).init()
+
+
+def save_entry(file_path, mood, note):
+    """Save a new entry in the data file with the current date and time."""
+    now = datetime.now()
+    save_entries(file_path, [[now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S"), mood, note]])
+
+
+def save_entries(file_path, rows):
+    """
+    Append [date, time, value, note] rows as one batch: a single write (and
+    fsync) to the storage, then one update for the whole batch of each kind
+    of derived data in use (statistics and note index), appended to its log.
+    """
+    storage = get_storage(file_path)
+    signature = storage.signature()
+    # Derived data in use that is up to date gets extended by the batch. Stale
+    # data is not rebuilt here, on the save path: the next get_statistics()
+    # or get_note_index() call does that.
+    extended = []
+    for cache, sidecar, log_path, cls in _logged_derived(file_path):
+        derived = cache.get(file_path)
+        if derived is None and os.path.exists(sidecar):
+            derived = cache[file_path] = _load_logged(sidecar, log_path, cls, signature)
+        if derived is not None and derived.signature == signature:
+            extended.append((derived, sidecar, log_path))
+    storage.append_rows(rows)
+    signature = storage.signature()
+    for derived, sidecar, log_path in extended:
+        _log_rows(sidecar, log_path, derived, rows, signature)
+
+
+def load_unique_dates_from_csv(file_path=None):
+    """
+    Return a sorted list of unique dates (YYYY-MM-DD) in file_path (default data file).
+    The dates come from the date index (sidecar file or SQLite index), not from the data.
+    """
+    storage = get_storage(file_path)
+    if not storage.exists():
+        return []
+    with mornfeels_trace.span("load.unique_dates"):
+        unique_dates = storage.unique_dates()
+    mornfeels_trace.count("load.unique_dates", len(unique_dates))
+    return unique_dates
+
+
+def filter_data_by_dates(start_date, end_date, file_path=None):
+    """
+    Filter data from file_path (default data file) between start_date and end_date (inclusive).
+    Assumes dates are in the format YYYY-MM-DD.
+    Only the rows in the range are read (via the date index).
+    Returns a list of rows.
+    """
+    with mornfeels_trace.span("filter"):
+        data = get_storage(file_path).read_range(start_date, end_date)
+    mornfeels_trace.count("filter.rows_matched", len(data))
+    return data
+
+
+def load_settings():
+    """Load reminder times from SETTINGS_FILE as a list of (hour, minute) tuples."""
+    if not os.path.exists(SETTINGS_FILE):
+        return [(8, 0), (12, 0), (16, 0), (20, 0)]
+    times = []
+    with open(SETTINGS_FILE, mode='r', newline='', encoding='utf-8') as file:
+        reader = csv.reader(file, delimiter=';')
+        for row in reader:
+            if len(row) == 2:
+                try:
+                    hour = int(row[0])
+                    minute = int(row[1])
+                    times.append((hour, minute))
+                except ValueError:
+                    pass
+    return sorted(times)
+
+
+def save_settings(times):
+    """Save the list of (hour, minute) tuples to SETTINGS_FILE."""
+    with open(SETTINGS_FILE, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file, delimiter=';')
+        for (hour, minute) in times:
+            writer.writerow([hour, minute])
+
+
+# ---------------------- Date Index ----------------------------
+#
+# The index is a sidecar CSV ("<data file>.idx") with one "Date;Offset" line
+# per run of consecutive rows sharing the same date. Rows are appended in
+# time order, so normally there is exactly one run per date and the runs are
+# sorted, which lets range queries binary-search straight to the byte span.
+# The index is append-only: new runs are added as the data file grows, and
+# the whole index is rebuilt if the data file shrinks or no longer matches.
+
+
+class DateIndex:
+    """Maps each run of same-date rows in a data CSV to its byte offset."""
+
+    def __init__(self, data_path):
+        self.data_path = data_path
+        self.index_path = data_path + DATE_INDEX_SUFFIX
+        self.dates = []         # date of each run, in file order
+        self.offsets = []       # byte offset of the first row of each run
+        self.indexed_size = 0   # bytes of the data file covered by the index
+        self.indexed_mtime = None
+        self.is_sorted = True   # runs strictly increasing by date
+        self._lock = threading.Lock()
+
+    # -- building and refreshing --
+
+    def refresh(self):
+        """Bring the index up to date with the data file (cheap when unchanged)."""
+        with self._lock:
+            if not os.path.exists(self.data_path):
+                self._reset()
+                return
+            stat = os.stat(self.data_path)
+            if stat.st_size == self.indexed_size and stat.st_mtime == self.indexed_mtime:
+                return
+            if not self.offsets and self.indexed_mtime is None:
+                self._load_index_file()
+            if stat.st_size < self.indexed_size or not self._tail_matches():
+                self._reset()
+                self._scan(rebuild=True)
+            else:
+                self._scan(rebuild=False)
+            self.indexed_size = stat.st_size
+            self.indexed_mtime = stat.st_mtime
+
+    def _reset(self):
+        self.dates = []
+        self.offsets = []
+        self.indexed_size = 0
+        self.indexed_mtime = None
+        self.is_sorted = True
+
+    def _load_index_file(self):
+        """Read the sidecar file. Only the last run is trusted as fully covered."""
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, mode='r', encoding='utf-8') as f:
+            reader = csv.reader(f, delimiter=';')
+            next(reader, None)
+            for row in reader:
+                if len(row) != 2:
+                    continue
+                try:
+                    self._add_run(row[0], int(row[1]))
+                except ValueError:
+                    self._reset()
+                    return
+        if self.offsets:
+            # Everything from the last run onwards is rescanned on refresh
+            self.indexed_size = self.offsets[-1]
+
+    def _tail_matches(self):
+        """Check that the last indexed run still starts where the index says."""
+        if not self.offsets:
+            return True
+        offset = self.offsets[-1]
+        with open(self.data_path, mode='rb') as f:
+            f.seek(max(offset - 1, 0))
+            head = f.read(len(self.dates[-1]) + 2)
+        if offset > 0:
+            if head[:1] != b"\n":
+                return False
+            head = head[1:]
+        return head.startswith(self.dates[-1].encode('utf-8') + b";")
+
+    def _add_run(self, date_str, offset):
+        if self.dates and date_str <= self.dates[-1]:
+            self.is_sorted = False
+        self.dates.append(date_str)
+        self.offsets.append(offset)
+
+    def _scan(self, rebuild):
+        """Index rows from the last known run (or the header) to the end of file."""
+        new_runs = []
+        with open(self.data_path, mode='rb') as f:
+            if self.offsets:
+                # Re-read the last run so rows appended to it are skipped cheaply
+                pos = self.offsets[-1]
+                f.seek(pos)
+                current = self.dates[-1]
+            else:
+                header = f.readline()
+                pos = len(header)
+                current = None
+            scan_start = pos
+            for raw in f:
+                line_start = pos
+                pos += len(raw)
+                if raw.count(b";") < 2:
+                    continue
+                date_str = raw.split(b";", 1)[0].decode('utf-8')
+                if date_str != current:
+                    current = date_str
+                    self._add_run(date_str, line_start)
+                    new_runs.append((date_str, line_start))
+        mornfeels_trace.count("index.bytes_scanned", pos - scan_start)
+        if rebuild or not os.path.exists(self.index_path):
+            self._write_index_file()
+        elif new_runs:
+            with open(self.index_path, mode='a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f, delimiter=';')
+                writer.writerows(new_runs)
+
+    def _write_index_file(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, mode='w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(['Date', 'Offset'])
+            writer.writerows(zip(self.dates, self.offsets))
+        os.replace(tmp_path, self.index_path)
+
+    # -- queries --
+
+    def unique_dates(self):
+        """Sorted list of unique dates, straight from the index."""
+        if self.is_sorted:
+            return list(self.dates)
+        return sorted(set(self.dates))
+
+    def _spans(self, start_date, end_date):
+        """Byte spans (start, end) of the runs whose date lies in the range."""
+        ends = self.offsets[1:] + [self.indexed_size]
+        if self.is_sorted:
+            i = bisect_left(self.dates, start_date)
+            j = bisect_right(self.dates, end_date)
+            return [(self.offsets[i], ends[j - 1])] if i < j else []
+        spans = []
+        for date_str, start, end in zip(self.dates, self.offsets, ends):
+            if start_date <= date_str <= end_date:
+                if spans and spans[-1][1] == start:
+                    spans[-1] = (spans[-1][0], end)
+                else:
+                    spans.append((start, end))
+        return spans
+
+    def read_range(self, start_date, end_date):
+        """Return the rows between start_date and end_date (inclusive), in file order."""
+        return list(self.iter_range(start_date, end_date))
+
+    def iter_range(self, start_date, end_date):
+        """
+        Yield the rows between start_date and end_date (inclusive), in file
+        order, reading at most READ_BLOCK_BYTES (cut at a line end) at a time.
+        """
+        self.refresh()
+        with self._lock:
+            spans = self._spans(start_date, end_date)
+        # The spans cover complete lines already written, which appends never change
+        with open(self.data_path, mode='rb') as f:
+            for start, end in spans:
+                f.seek(start)
+                pending = b""
+                remaining = end - start
+                while True:
+                    block = f.read(min(READ_BLOCK_BYTES, remaining))
+                    remaining -= len(block)
+                    last = remaining <= 0 or not block
+                    block = pending + block
+                    # Parse complete lines only; the rest waits for the next block
+                    cut = len(block) if last else block.rfind(b"\n") + 1
+                    block, pending = block[:cut], block[cut:]
+                    if block:
+                        mornfeels_trace.count("filter.bytes_read", len(block))
+                        reader = csv.reader(io.StringIO(block.decode('utf-8')), delimiter=';')
+                        for row in reader:
+                            if len(row) >= 3 and start_date <= row[0] <= end_date:
+                                yield row
+                        mornfeels_trace.count("filter.rows_scanned", reader.line_num)
+                    if last:
+                        break
+
+
+_date_indexes = {}
+
+
+def get_date_index(file_path):
+    """Return the (refreshed) date index for file_path, shared per process."""
+    index = _date_indexes.get(file_path)
+    if index is None:
+        index = _date_indexes.setdefault(file_path, DateIndex(file_path))
+    index.refresh()
+    return index
+
+
+# ---------------------- Aggregation ----------------------------
+
+
+MOOD_COLORS = {
+    6: "lightgreen", 5: "darkgreen",
+    4: "lightsalmon", 3: "darkred",
+    2: "lightgrey",   1: "darkgrey",
+    0: "black"
+}
+# Largest mood value the record stores keep (0-6 in the UI); both the pure
+# Python and the NumPy backend skip rows outside 0..MAX_MOOD_VALUE
+MAX_MOOD_VALUE = 127
+
+
+def aggregate_mood_data(filtered_data):
+    """
+    Group the filtered rows by date in a single pass.
+    Returns a dict with:
+      "dates":       sorted list of dates that have at least one valid value
+      "daily_count": {date: number of values}
+      "daily_sum":   {date: sum of values}
+      "daily_hist":  {date: {value: frequency}}
+      "hist":        {value: frequency} over the whole range
+    Rows whose value is not an integer are skipped.
+    """
+    daily_count = {}
+    daily_sum = {}
+    daily_hist = {}
+    hist = {}
+    for row in filtered_data:
+        try:
+            val = int(row[2])
+        except ValueError:
+            continue
+        d = row[0]
+        day_hist = daily_hist.get(d)
+        if day_hist is None:
+            day_hist = daily_hist[d] = {}
+            daily_count[d] = 0
+            daily_sum[d] = 0
+        day_hist[val] = day_hist.get(val, 0) + 1
+        daily_count[d] += 1
+        daily_sum[d] += val
+        hist[val] = hist.get(val, 0) + 1
+    return {
+        "dates": sorted(daily_hist),
+        "daily_count": daily_count,
+        "daily_sum": daily_sum,
+        "daily_hist": daily_hist,
+        "hist": hist,
+    }
+
+
+def as_aggregate(data):
+    """Accept either filtered rows or an aggregate_mood_data() result."""
+    if isinstance(data, dict):
+        return data
+    return aggregate_mood_data(data)
+
+
+def merge_aggregates(aggregates):
+    """
+    Combine aggregate_mood_data() results of disjoint row sets (e.g. one per
+    partition) into one. A date present in several parts is summed.
+    """
+    merged = {"dates": [], "daily_count": {}, "daily_sum": {}, "daily_hist": {}, "hist": {}}
+    daily_count, daily_sum = merged["daily_count"], merged["daily_sum"]
+    daily_hist, hist = merged["daily_hist"], merged["hist"]
+    for part in aggregates:
+        for d in part["dates"]:
+            day_hist = daily_hist.get(d)
+            if day_hist is None:
+                daily_hist[d] = dict(part["daily_hist"][d])
+                daily_count[d] = part["daily_count"][d]
+                daily_sum[d] = part["daily_sum"][d]
+                continue
+            for val, n in part["daily_hist"][d].items():
+                day_hist[val] = day_hist.get(val, 0) + n
+            daily_count[d] += part["daily_count"][d]
+            daily_sum[d] += part["daily_sum"][d]
+        for val, n in part["hist"].items():
+            hist[val] = hist.get(val, 0) + n
+    merged["dates"] = sorted(daily_hist)
+    return merged
+
+
+# ---------------------- Tail Reader ----------------------------
+
+
+# Bytes just before the read offset that are re-checked to detect rewrites
+TAIL_FINGERPRINT_BYTES = 64
+
+
+class TailReader:
+    """
+    Session-level reader of an append-only data file. Remembers how far it
+    has read (offset, size, mtime, inode and the bytes just before the
+    offset), so each read() returns only the complete lines appended since.
+    Truncation, replacement, a changed mtime without growth, or changed bytes
+    just before the offset mark a rewrite, and the whole file is returned instead.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0          # end of the last complete line read
+        self.size = None
+        self.mtime = None
+        self.inode = None
+        self.fingerprint = b""   # the TAIL_FINGERPRINT_BYTES bytes before offset
+
+    def read(self):
+        """
+        (data, full): the new complete lines, and whether data starts at the
+        top of the file (header included), in which case everything built
+        from earlier reads must be dropped. (b"", False) when nothing changed.
+        A missing file gives (b"", True).
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self.__init__(self.path)
+            return b"", True
+        if stat.st_size == self.size and stat.st_mtime_ns == self.mtime and stat.st_ino == self.inode:
+            return b"", False
+        with open(self.path, mode="rb") as f:
+            # Appends always grow the file: a new mtime at the same size is a rewrite
+            full = (self.offset == 0 or stat.st_ino != self.inode or stat.st_size <= self.size
+                    or stat.st_size < self.offset or not self._fingerprint_matches(f))
+            start = 0 if full else self.offset
+            f.seek(start)
+            data = f.read(stat.st_size - start)
+            # Only consume complete lines; a half-written row is picked up next time
+            data = data[:data.rfind(b"\n") + 1]
+            self.offset = start + len(data)
+            if len(data) >= TAIL_FINGERPRINT_BYTES or start == 0:
+                self.fingerprint = data[-TAIL_FINGERPRINT_BYTES:]
+            else:
+                f.seek(max(self.offset - TAIL_FINGERPRINT_BYTES, 0))
+                self.fingerprint = f.read(self.offset - max(self.offset - TAIL_FINGERPRINT_BYTES, 0))
+        self.size, self.mtime, self.inode = stat.st_size, stat.st_mtime_ns, stat.st_ino
+        mornfeels_trace.count("load.bytes_read", len(data))
+        return data, full
+
+    def _fingerprint_matches(self, f):
+        f.seek(self.offset - len(self.fingerprint))
+        return f.read(len(self.fingerprint)) == self.fingerprint
+
+
+# ---------------------- Record Store ----------------------------
+#
+# Entries parsed once per session into compact typed columns: day ordinals
+# and seconds-of-day as array('i'), mood values as array('b'), plus a list
+# of notes. About 9 bytes per entry (plus the note) instead of a list of
+# four strings, and no consumer has to re-parse dates or values.
+
+
+class MoodRecords:
+    """Date-sorted, column-oriented mood entries backed by array.array."""
+
+    __slots__ = ("days", "seconds", "values", "notes")
+
+    def __init__(self, days=None, seconds=None, values=None, notes=None):
+        self.days = days if days is not None else array('i')        # date.toordinal()
+        self.seconds = seconds if seconds is not None else array('i')  # seconds since midnight
+        self.values = values if values is not None else array('b')    # mood values
+        self.notes = notes if notes is not None else []
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def nbytes(self):
+        return (self.days.itemsize * len(self.days) + self.seconds.itemsize * len(self.seconds)
+                + self.values.itemsize * len(self.values))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build the columns from CSV rows ([date, time, value, note]).
+        Rows with an unparseable date or a value outside 0..MAX_MOOD_VALUE are skipped.
+        """
+        records = cls()
+        days, seconds, values, notes = records.days, records.seconds, records.values, records.notes
+        ordinals = {}
+        for row in rows:
+            if len(row) < 3:
+                continue
+            d_str = row[0]
+            day = ordinals.get(d_str)
+            if day is None:
+                try:
+                    day = ordinals[d_str] = date.fromisoformat(d_str).toordinal()
+                except ValueError:
+                    day = ordinals[d_str] = False
+            try:
+                val = int(row[2])
+            except ValueError:
+                continue
+            if day is False or not 0 <= val <= MAX_MOOD_VALUE:
+                continue
+            days.append(day)
+            seconds.append(_time_to_seconds(row[1]))
+            values.append(val)
+            notes.append(row[3] if len(row) > 3 else "")
+        if any(a > b for a, b in zip(days, days[1:])):
+            records = records._sorted()
+        return records
+
+    def _sorted(self):
+        # Stable, so rows keep their file order within a day
+        return self.select(sorted(range(len(self.days)), key=self.days.__getitem__))
+
+    def concat(self, other):
+        """Return self followed by other, re-sorted by date if needed."""
+        if not len(other):
+            return self
+        if not len(self):
+            return other
+        records = MoodRecords(self.days + other.days, self.seconds + other.seconds,
+                              self.values + other.values, self.notes + other.notes)
+        if other.days[0] < self.days[-1]:
+            records = records._sorted()
+        return records
+
+    # -- queries --
+
+    def filter_range(self, start_date, end_date):
+        """Entries between start_date and end_date (inclusive, YYYY-MM-DD)."""
+        lo = bisect_left(self.days, date.fromisoformat(start_date).toordinal())
+        hi = bisect_right(self.days, date.fromisoformat(end_date).toordinal())
+        return MoodRecords(self.days[lo:hi], self.seconds[lo:hi],
+                           self.values[lo:hi], self.notes[lo:hi])
+
+    def select(self, positions):
+        """The entries at the given positions, in that order."""
+        return MoodRecords(array('i', [self.days[i] for i in positions]),
+                           array('i', [self.seconds[i] for i in positions]),
+                           array('b', [self.values[i] for i in positions]),
+                           [self.notes[i] for i in positions])
+
+    def rows(self):
+        """The entries as [date, time, value, note] rows (times as HH:MM:SS)."""
+        for day, second, val, note in zip(self.days, self.seconds, self.values, self.notes):
+            h, rem = divmod(second, 3600)
+            yield [date.fromordinal(day).isoformat(), f"{h:02d}:{rem // 60:02d}:{rem % 60:02d}",
+                   str(val), note]
+
+    def aggregate(self):
+        """Same shape as aggregate_mood_data(); each date is formatted once."""
+        daily_count = {}
+        daily_sum = {}
+        daily_hist = {}
+        hist = {}
+        day_hist = None
+        current = None
+        for day, val in zip(self.days, self.values):
+            if day != current:
+                current = day
+                d = date.fromordinal(day).isoformat()
+                day_hist = daily_hist[d] = {}
+                daily_count[d] = 0
+                daily_sum[d] = 0
+            day_hist[val] = day_hist.get(val, 0) + 1
+            daily_count[d] += 1
+            daily_sum[d] += val
+            hist[val] = hist.get(val, 0) + 1
+        return {
+            "dates": list(daily_hist),
+            "daily_count": daily_count,
+            "daily_sum": daily_sum,
+            "daily_hist": daily_hist,
+            "hist": hist,
+        }
+
+
+def _time_to_seconds(time_str):
+    """"HH:MM" or "HH:MM:SS" -> seconds since midnight (0 if unparseable)."""
+    parts = time_str.split(":")
+    try:
+        hms = [int(p) for p in parts[:3]] + [0] * (3 - len(parts[:3]))
+    except ValueError:
+        return 0
+    return hms[0] * 3600 + hms[1] * 60 + hms[2]
+
+
+class _CachedRecords:
+    def __init__(self, file_path):
+        self.records = MoodRecords()
+        self.reader = TailReader(file_path)
+        self.lock = threading.Lock()
+
+
+_records_cache = {}
+
+
+def load_mood_records(file_path):
+    """
+    Return MoodRecords for the CSV file_path, loaded once per session.
+    When the file only grew (new entries appended), just the new bytes are
+    parsed and merged; a truncated or rewritten file is reloaded in full.
+    """
+    entry = _records_cache.get(file_path)
+    if entry is None:
+        entry = _records_cache.setdefault(file_path, _CachedRecords(file_path))
+    with entry.lock:
+        data, full = entry.reader.read()
+        if not data and not full:
+            return entry.records
+        with mornfeels_trace.span("load.records"):
+            reader = csv.reader(io.StringIO(data.decode("utf-8")), delimiter=";")
+            if full:
+                next(reader, None)
+                entry.records = MoodRecords.from_rows(reader)
+            else:
+                entry.records = entry.records.concat(MoodRecords.from_rows(reader))
+        mornfeels_trace.count("load.rows_parsed", reader.line_num)
+        return entry.records
+
+
+_mornfeels_numpy = None
+
+
+def _numpy_backend():
+    """Import the optional NumPy backend on first use (None if NumPy is missing)."""
+    global _mornfeels_numpy
+    if _mornfeels_numpy is None:
+        try:
+            import mornfeels_numpy
+            _mornfeels_numpy = mornfeels_numpy
+        except ImportError:
+            _mornfeels_numpy = False
+    return _mornfeels_numpy or None
+
+
+# ---------------------- Storage Backends ----------------------------
+#
+# A storage backend provides exists(), init(), append_rows(),
+# unique_dates(), read_range() (and iter_range(), its streaming form) and
+# aggregate_range() for one data file. Rows come back as
+# [date, time, value, note] strings, just like csv.reader() produces them.
+
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+@contextmanager
+def data_file_lock(path):
+    """
+    Hold the exclusive lock of the data CSV at path ("<path>.lock") for the
+    with block. Appends take it, and compaction takes it while it swaps the
+    file, so no entry is written to a file that is being replaced.
+    """
+    with open(path + LOCK_SUFFIX, mode='a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class CsvStorage:
+    """
+    The semicolon-separated CSV file, with its sidecar date index. Closed
+    months moved out by compaction (see mornfeels_segments) are read from
+    "<path>.segments/" transparently.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def segments(self):
+        """The SegmentStore of this file, or None if it was never compacted."""
+        if not os.path.isdir(self.path + SEGMENTS_SUFFIX):
+            return None
+        import mornfeels_segments
+        return mornfeels_segments.get_segment_store(self.path)
+
+    def exists(self):
+        return os.path.exists(self.path) or self.segments() is not None
+
+    def signature(self):
+        """Changes whenever the data changes (used to validate derived files)."""
+        if not self.exists():
+            return None
+        signature = [0, 0]
+        if os.path.exists(self.path):
+            stat = os.stat(self.path)
+            signature = [stat.st_size, stat.st_mtime_ns]
+        segments = self.segments()
+        if segments is not None and segments.months():
+            # An empty segment directory (compaction just started) changes nothing
+            signature.append(segments.signature())
+        return signature
+
+    def init(self):
+        if not os.path.exists(self.path):
+            with open(self.path, mode='w', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file, delimiter=';')
+                writer.writerow(['Date', 'Time', 'Value', 'Note'])
+
+    def append_rows(self, rows):
+        """Append [date, time, value, note] rows with one buffered write and one fsync."""
+        buffer = io.StringIO()
+        csv.writer(buffer, delimiter=';').writerows(rows)
+        with data_file_lock(self.path), open(self.path, mode='a', newline='', encoding='utf-8') as file:
+            file.write(buffer.getvalue())
+            file.flush()
+            os.fsync(file.fileno())
+        self._extend_date_index()
+
+    def _extend_date_index(self):
+        # Extend the date index (if one is in use) by the rows just written
+        if self.path in _date_indexes or os.path.exists(self.path + DATE_INDEX_SUFFIX):
+            get_date_index(self.path)
+
+    def unique_dates(self):
+        dates = get_date_index(self.path).unique_dates() if os.path.exists(self.path) else []
+        segments = self.segments()
+        if segments is not None:
+            dates = sorted(set(segments.unique_dates()).union(dates))
+        return dates
+
+    def read_range(self, start_date, end_date):
+        return list(self.iter_range(start_date, end_date))
+
+    def iter_range(self, start_date, end_date):
+        """read_range() as a stream, holding one block (or segment) of rows at a time."""
+        segments = self.segments()
+        if segments is not None:
+            # Segments hold the older months, so they come first
+            yield from segments.iter_range(start_date, end_date)
+        if os.path.exists(self.path):
+            yield from get_date_index(self.path).iter_range(start_date, end_date)
+
+    def records(self):
+        """The whole file as MoodArrays (NumPy backend) or MoodRecords, shared per session."""
+        backend = _numpy_backend() if USE_NUMPY_BACKEND else None
+        if backend is not None:
+            return backend.load_mood_arrays(self.path)
+        return load_mood_records(self.path)
+
+    def aggregate_range(self, start_date, end_date):
+        selected = self.records().filter_range(start_date, end_date)
+        mornfeels_trace.count("aggregate.rows_matched", len(selected))
+        segments = self.segments()
+        if segments is None:
+            return selected.aggregate()
+        # Segment days come precomputed from their metas
+        return merge_aggregates([segments.aggregate_range(start_date, end_date), selected.aggregate()])
+
+
+class SqliteStorage:
+    """
+    SQLite database in WAL mode. Entries are indexed by (date, time), so range
+    queries and the distinct-date listing are index seeks, and the daily
+    aggregates are computed by SQLite. Each thread gets its own connection,
+    whose statement cache keeps the (constant, parameterized) queries prepared.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS entries ("
+        " date TEXT NOT NULL, time TEXT NOT NULL, value INTEGER, note TEXT)",
+        "CREATE INDEX IF NOT EXISTS entries_date_time ON entries (date, time)",
+    )
+    INSERT = "INSERT INTO entries (date, time, value, note) VALUES (?, ?, ?, ?)"
+    SELECT_DATES = "SELECT DISTINCT date FROM entries ORDER BY date"
+    SELECT_RANGE = ("SELECT date, time, value, note FROM entries"
+                    " WHERE date BETWEEN ? AND ? ORDER BY date, time")
+    # Rows whose value is not an integer are skipped, as in aggregate_mood_data()
+    SELECT_DAILY_HIST = ("SELECT date, value, COUNT(*) FROM entries"
+                         " WHERE date BETWEEN ? AND ? AND typeof(value) = 'integer'"
+                         " GROUP BY date, value ORDER BY date, value")
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            import sqlite3
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Durable at checkpoints; a crash can lose at most the last commits, never corrupt
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close this thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def signature(self):
+        if not os.path.exists(self.path):
+            return None
+        return list(self._connect().execute("SELECT COUNT(*), MAX(rowid) FROM entries").fetchone())
+
+    def init(self):
+        self._connect()
+
+    def append_rows(self, rows):
+        """Insert [date, time, value, note] rows in one transaction."""
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(self.INSERT, rows)
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def unique_dates(self):
+        if not os.path.exists(self.path):
+            return []
+        return [row[0] for row in self._connect().execute(self.SELECT_DATES)]
+
+    def read_range(self, start_date, end_date):
+        return list(self.iter_range(start_date, end_date))
+
+    def iter_range(self, start_date, end_date, batch_size=1000):
+        """read_range() as a stream, fetching batch_size rows at a time."""
+        cursor = self._connect().execute(self.SELECT_RANGE, (start_date, end_date))
+        for batch in iter(lambda: cursor.fetchmany(batch_size), []):
+            for d, t, value, note in batch:
+                yield [d, t, "" if value is None else str(value), "" if note is None else note]
+
+    def aggregate_range(self, start_date, end_date):
+        """aggregate_mood_data() shape, built from one GROUP BY (date, value) query."""
+        daily_count = {}
+        daily_sum = {}
+        daily_hist = {}
+        hist = {}
+        for d, val, n in self._connect().execute(self.SELECT_DAILY_HIST, (start_date, end_date)):
+            day_hist = daily_hist.get(d)
+            if day_hist is None:
+                day_hist = daily_hist[d] = {}
+                daily_count[d] = 0
+                daily_sum[d] = 0
+            day_hist[val] = n
+            daily_count[d] += n
+            daily_sum[d] += val * n
+            hist[val] = hist.get(val, 0) + n
+        mornfeels_trace.count("aggregate.rows_matched", sum(daily_count.values()))
+        return {
+            "dates": list(daily_hist),
+            "daily_count": daily_count,
+            "daily_sum": daily_sum,
+            "daily_hist": daily_hist,
+            "hist": hist,
+        }
+
+
+class PartitionedStorage:
+    """
+    One CSV file per month ("YYYY-MM.csv") in a directory, each with its own
+    sidecar date index. Entries go to the partition of their date, and range
+    queries only open the partitions that overlap the range, so looking at
+    recent weeks costs the same however many years the journal holds.
+    """
+
+    PARTITION_SUFFIX = ".csv"
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._months = []           # sorted "YYYY-MM" of the partitions on disk
+        self._listed_mtime = None   # directory mtime when _months was listed
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.isdir(self.directory)
+
+    def signature(self):
+        if not os.path.isdir(self.directory):
+            return None
+        return [[month] + get_storage(self.partition_path(month)).signature() for month in self.months()]
+
+    def init(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    def partition_path(self, month):
+        return os.path.join(self.directory, month + self.PARTITION_SUFFIX)
+
+    def months(self):
+        """Sorted months that have a partition (re-listed only when the directory changes)."""
+        with self._lock:
+            try:
+                mtime = os.stat(self.directory).st_mtime
+            except OSError:
+                self._months, self._listed_mtime = [], None
+                return []
+            if mtime != self._listed_mtime:
+                months = []
+                for name in os.listdir(self.directory):
+                    month, suffix = name[:-len(self.PARTITION_SUFFIX)], name[-len(self.PARTITION_SUFFIX):]
+                    if suffix == self.PARTITION_SUFFIX and len(month) == 7 and month[4] == "-":
+                        months.append(month)
+                self._months, self._listed_mtime = sorted(months), mtime
+            return list(self._months)
+
+    def _partitions(self, start_date, end_date):
+        """CsvStorage of each partition overlapping start_date..end_date, in month order."""
+        months = self.months()
+        i = bisect_left(months, start_date[:7])
+        j = bisect_right(months, end_date[:7])
+        return [get_storage(self.partition_path(month)) for month in months[i:j]]
+
+    def append_rows(self, rows):
+        """Append [date, time, value, note] rows, one file open per partition touched."""
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row[0][:7], []).append(row)
+        self.init()
+        for month, month_rows in by_month.items():
+            partition = get_storage(self.partition_path(month))
+            partition.init()
+            partition.append_rows(month_rows)
+
+    def unique_dates(self):
+        """From the partitions' date indexes, in partition (= date) order."""
+        dates = []
+        for partition in self._partitions("0000-00", "9999-99"):
+            dates.extend(partition.unique_dates())
+        if any(a >= b for a, b in zip(dates, dates[1:])):
+            dates = sorted(set(dates))
+        return dates
+
+    def read_range(self, start_date, end_date):
+        return list(self.iter_range(start_date, end_date))
+
+    def iter_range(self, start_date, end_date):
+        for partition in self._partitions(start_date, end_date):
+            yield from partition.iter_range(start_date, end_date)
+
+    def aggregate_range(self, start_date, end_date):
+        parts = [partition.aggregate_range(start_date, end_date)
+                 for partition in self._partitions(start_date, end_date)]
+        if len(parts) == 1:
+            return parts[0]
+        return merge_aggregates(parts)
+
+
+_storages = {}
+
+
+def get_storage(file_path=None):
+    """
+    Return the storage backend for file_path (default: the app's data file),
+    shared per process. The backend is chosen by the file extension; a
+    directory (or DATA_DIR) holds monthly partitions.
+    """
+    file_path = file_path or default_data_path()
+    storage = _storages.get(file_path)
+    if storage is None:
+        if file_path.lower().endswith(SQLITE_SUFFIXES):
+            storage = SqliteStorage(file_path)
+        elif file_path == DATA_DIR or os.path.isdir(file_path):
+            storage = PartitionedStorage(file_path)
+        else:
+            storage = CsvStorage(file_path)
+        storage = _storages.setdefault(file_path, storage)
+    return storage
+
+
+def _sqlite_value(value):
+    """Store integer mood values as integers; anything else is kept as text."""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def _csv_batches(csv_path, batch_size):
+    """Yield the rows of a mood CSV as lists of [date, time, value, note], batch_size at a time."""
+    with open(csv_path, mode='r', newline='', encoding='utf-8') as file:
+        reader = csv.reader(file, delimiter=';')
+        next(reader, None)
+        batch = []
+        for row in reader:
+            if len(row) < 3:
+                continue
+            batch.append([row[0], row[1], row[2], row[3] if len(row) > 3 else ""])
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def migrate_csv_to_sqlite(csv_path, db_path, batch_size=10000):
+    """
+    Copy every row of a mood CSV into a new SQLite database (one-shot).
+    Refuses to run if db_path already holds entries. Returns the number of rows copied.
+    """
+    target = get_storage(db_path)
+    if not isinstance(target, SqliteStorage):
+        raise ValueError(f"{db_path} is not a SQLite path (use one of {', '.join(SQLITE_SUFFIXES)})")
+    if target.exists() and target.count():
+        raise ValueError(f"{db_path} already contains entries")
+    copied = 0
+    for batch in _csv_batches(csv_path, batch_size):
+        target.append_rows([(d, t, _sqlite_value(v), note) for d, t, v, note in batch])
+        copied += len(batch)
+    return copied
+
+
+def migrate_csv_to_partitions(csv_path, directory, batch_size=10000):
+    """
+    Split a mood CSV into monthly partition files under directory (one-shot).
+    Refuses to run if directory already holds partitions. Returns the number of rows copied.
+    """
+    if os.path.exists(directory) and not os.path.isdir(directory):
+        raise ValueError(f"{directory} is not a directory")
+    os.makedirs(directory, exist_ok=True)
+    target = get_storage(directory)
+    if target.months():
+        raise ValueError(f"{directory} already contains partitions")
+    copied = 0
+    for batch in _csv_batches(csv_path, batch_size):
+        target.append_rows(batch)
+        copied += len(batch)
+    return copied
+
+
+# ---------------------- Rollups ----------------------------
+#
+# Weekly, monthly and yearly count/sum/min/max of the mood values, keyed by
+# the first day of each bucket (weeks start on Monday). The line chart
+# builds them from the aggregate of its range. The rollups of a whole
+# journal (for the rollups command) are kept in a "<data path>.rollups.json"
+# sidecar and rebuilt on request once the journal has changed; saving
+# entries does not touch them.
+
+
+ROLLUP_LEVELS = ("week", "month", "year")
+
+
+def bucket_start(date_str, level):
+    """First day (YYYY-MM-DD) of the day, week, month or year containing date_str."""
+    if level == "day":
+        return date.fromisoformat(date_str).isoformat()
+    if level == "month":
+        return date_str[:8] + "01"
+    if level == "year":
+        return date_str[:5] + "01-01"
+    d = date.fromisoformat(date_str)
+    return date.fromordinal(d.toordinal() - d.weekday()).isoformat()
+
+
+class Rollups:
+    """Per-bucket [count, sum, min, max] of mood values for each ROLLUP_LEVELS level."""
+
+    def __init__(self, levels=None, signature=None):
+        self.levels = levels or {level: {} for level in ROLLUP_LEVELS}
+        self.signature = signature   # storage signature the rollups match
+
+    def add_day(self, date_str, count, total, low, high):
+        """Fold one day's count, sum, min and max into every level."""
+        for level, buckets in self.levels.items():
+            key = bucket_start(date_str, level)
+            stats = buckets.get(key)
+            if stats is None:
+                buckets[key] = [count, total, low, high]
+            else:
+                stats[0] += count
+                stats[1] += total
+                stats[2] = min(stats[2], low)
+                stats[3] = max(stats[3], high)
+
+    @classmethod
+    def from_aggregate(cls, aggregate):
+        """Rollups of an aggregate_mood_data() result (one step per day, not per row)."""
+        rollups = cls()
+        for d in aggregate["dates"]:
+            try:
+                date.fromisoformat(d)
+            except ValueError:
+                continue
+            values = aggregate["daily_hist"][d]
+            rollups.add_day(d, aggregate["daily_count"][d], aggregate["daily_sum"][d],
+                            min(values), max(values))
+        return rollups
+
+    def series(self, level, start_date=None, end_date=None):
+        """
+        [(bucket start, mean, min, max, count)] of one level in date order,
+        for the buckets overlapping start_date..end_date (default: all).
+        """
+        buckets = self.levels[level]
+        first = bucket_start(start_date, level) if start_date else None
+        result = []
+        for key in sorted(buckets):
+            if (first and key < first) or (end_date and key > end_date):
+                continue
+            count, total, low, high = buckets[key]
+            result.append((key, total / count, low, high, count))
+        return result
+
+    def to_json(self):
+        return json.dumps({"signature": self.signature, "levels": self.levels})
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        return cls({level: data["levels"][level] for level in ROLLUP_LEVELS}, data["signature"])
+
+
+_rollups = {}
+
+
+def _rollups_path(storage_path):
+    return os.path.normpath(storage_path) + ROLLUPS_SUFFIX
+
+
+def _read_sidecar(path, cls):
+    """cls.from_json() of the sidecar file at path, or None if it is missing or unreadable."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, mode='r', encoding='utf-8') as f:
+            return cls.from_json(f.read())
+    except (ValueError, KeyError, TypeError, OverflowError):
+        return None
+
+
+def _write_sidecar(path, derived):
+    """Replace the sidecar file at path with derived.to_json() (atomically)."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, mode='w', encoding='utf-8') as f:
+        f.write(derived.to_json())
+    os.replace(tmp_path, path)
+
+
+# Derived data that changes with every save (statistics, note index) keeps a
+# log next to its sidecar: each saved batch is appended as one JSON line with
+# the storage signatures before and after it, instead of rewriting the
+# sidecar. Loading replays the log; every SIDECAR_LOG_MAX_ROWS entries the
+# sidecar is rewritten and the log emptied. Such classes have add_rows(),
+# signature and logged (entries in the log).
+
+
+def _replay_log(log_path, derived):
+    """
+    Add the batches logged since derived's sidecar was written. Lines already
+    folded into the sidecar do not start at its signature and are skipped; a
+    torn last line (interrupted save) ends the replay.
+    """
+    if not os.path.exists(log_path):
+        return
+    with open(log_path, mode='r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                batch = json.loads(line)
+                if batch["base"] != derived.signature:
+                    continue
+                derived.add_rows(batch["rows"])
+                derived.signature = batch["signature"]
+                derived.logged += len(batch["rows"]) or 1
+            except (ValueError, KeyError, TypeError):
+                break
+
+
+def _load_logged(sidecar, log_path, cls, signature):
+    """cls from its sidecar plus log (never rebuilt), or None without a readable sidecar."""
+    derived = _read_sidecar(sidecar, cls)
+    if derived is not None and derived.signature != signature:
+        _replay_log(log_path, derived)
+    return derived
+
+
+def _save_logged(sidecar, log_path, derived):
+    """Write derived to its sidecar and empty its log."""
+    _write_sidecar(sidecar, derived)
+    if os.path.exists(log_path):
+        os.remove(log_path)
+    derived.logged = 0
+
+
+def _log_rows(sidecar, log_path, derived, rows, signature):
+    """
+    Fold just-saved rows into derived (now matching signature) and append
+    them to its log, or rewrite the sidecar once the log is long enough.
+    """
+    base = derived.signature
+    rows = [[str(field) for field in row[:4]] for row in rows]
+    derived.add_rows(rows)
+    derived.signature = signature
+    derived.logged += len(rows) or 1
+    if derived.logged >= SIDECAR_LOG_MAX_ROWS:
+        _save_logged(sidecar, log_path, derived)
+        return
+    with open(log_path, mode='a', encoding='utf-8') as f:
+        f.write(json.dumps({"base": base, "signature": signature, "rows": rows}) + "\n")
+
+
+def get_rollups(file_path=None):
+    """
+    Weekly/monthly/yearly rollups of the whole journal at file_path (default
+    data file). Read from the sidecar when it still matches the data,
+    otherwise rebuilt from one full-range aggregate and saved.
+    """
+    file_path = file_path or default_data_path()
+    storage = get_storage(file_path)
+    signature = storage.signature()
+    rollups = _rollups.get(file_path)
+    if rollups is not None and rollups.signature == signature:
+        return rollups
+    sidecar = _rollups_path(file_path)
+    rollups = _read_sidecar(sidecar, Rollups)
+    if rollups is None or rollups.signature != signature:
+        with mornfeels_trace.span("aggregate.rollups"):
+            dates = storage.unique_dates()
+            if dates:
+                rollups = Rollups.from_aggregate(storage.aggregate_range(dates[0], dates[-1]))
+            else:
+                rollups = Rollups()
+            rollups.signature = signature
+        if signature is not None:
+            _write_sidecar(sidecar, rollups)
+    _rollups[file_path] = rollups
+    return rollups
+
+
+# ---------------------- Statistics ----------------------------
+#
+# Running count, mean and variance of the mood values (Welford's method)
+# per day, week and month and per hour of the day, from which rolling
+# averages and trend figures are answered without reading the journal.
+# They are built once per journal and kept in a "<data path>.stats.json"
+# sidecar; save_entries() folds new entries in and appends them to a
+# "<data path>.stats.log" (see _log_rows()).
+
+
+STATISTICS_LEVELS = ("day", "week", "month")
+ROLLING_WINDOWS = (7, 30)
+
+
+class RunningStats:
+    """Count, mean and sum of squared deviations (M2) of a stream of values."""
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        """Fold in the stats of another, disjoint set of values (Chan et al.)."""
+        if not other.n:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    @classmethod
+    def from_hist(cls, hist):
+        """Stats of a {value: frequency} histogram."""
+        n = sum(hist.values())
+        if not n:
+            return cls()
+        mean = sum(val * freq for val, freq in hist.items()) / n
+        return cls(n, mean, sum(freq * (val - mean) ** 2 for val, freq in hist.items()))
+
+    @property
+    def variance(self):
+        """Sample variance (0.0 for fewer than two values)."""
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class Statistics:
+    """RunningStats per STATISTICS_LEVELS bucket and per hour of day (0-23)."""
+
+    def __init__(self, levels=None, hours=None, signature=None):
+        self.levels = levels or {level: {} for level in STATISTICS_LEVELS}
+        self.hours = hours or [RunningStats() for _ in range(24)]
+        self.signature = signature   # storage signature the statistics match
+        self.logged = 0              # entries in the statistics log (not in the sidecar)
+
+    def add(self, date_str, time_str, value):
+        """Fold one entry in (O(1)). Raises ValueError for an invalid date."""
+        keys = [(buckets, bucket_start(date_str, level)) for level, buckets in self.levels.items()]
+        for buckets, key in keys:
+            stats = buckets.get(key)
+            if stats is None:
+                stats = buckets[key] = RunningStats()
+            stats.add(value)
+        self.hours[_time_to_seconds(time_str) // 3600 % 24].add(value)
+
+    def add_rows(self, rows):
+        """Fold in [date, time, value, note] rows; rows with an invalid date or value are skipped."""
+        for row in rows:
+            try:
+                self.add(row[0], row[1], int(row[2]))
+            except ValueError:
+                continue
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Statistics of a whole journal. Values are counted into per-day and
+        per-hour histograms first, so the float work is per day, not per row.
+        """
+        daily_hist = {}
+        hourly_hist = [{} for _ in range(24)]
+        for row in rows:
+            if len(row) < 3:
+                continue
+            try:
+                val = int(row[2])
+            except ValueError:
+                continue
+            day_hist = daily_hist.get(row[0])
+            if day_hist is None:
+                try:
+                    date.fromisoformat(row[0])
+                except ValueError:
+                    # Skipped, as by add(); remembered so the date is parsed once
+                    day_hist = daily_hist[row[0]] = False
+                else:
+                    day_hist = daily_hist[row[0]] = {}
+            if day_hist is False:
+                continue
+            day_hist[val] = day_hist.get(val, 0) + 1
+            hour_hist = hourly_hist[_time_to_seconds(row[1]) // 3600 % 24]
+            hour_hist[val] = hour_hist.get(val, 0) + 1
+        statistics = cls()
+        for d_str in sorted(d for d, hist in daily_hist.items() if hist is not False):
+            day = RunningStats.from_hist(daily_hist[d_str])
+            for level, buckets in statistics.levels.items():
+                key = bucket_start(d_str, level)
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = RunningStats()
+                bucket.merge(day)
+        statistics.hours = [RunningStats.from_hist(hist) for hist in hourly_hist]
+        return statistics
+
+    # -- queries --
+
+    def get(self, level, date_str):
+        """RunningStats of the level bucket containing date_str (None if it has no entries)."""
+        return self.levels[level].get(bucket_start(date_str, level))
+
+    def series(self, level, start_date=None, end_date=None):
+        """[(bucket start, count, mean, std)] of one level in date order (default: all)."""
+        buckets = self.levels[level]
+        first = bucket_start(start_date, level) if start_date else None
+        return [(key, buckets[key].n, buckets[key].mean, buckets[key].std) for key in sorted(buckets)
+                if not (first and key < first) and not (end_date and key > end_date)]
+
+    def rolling_mean(self, window, end_date=None):
+        """
+        (mean, count) of the entries of the `window` days ending with end_date
+        (default today); mean is None if there are none. O(window).
+        """
+        end = date.fromisoformat(end_date) if end_date else date.today()
+        days = self.levels["day"]
+        total = RunningStats()
+        for offset in range(window):
+            stats = days.get((end - timedelta(days=offset)).isoformat())
+            if stats is not None:
+                total.merge(stats)
+        return (total.mean if total.n else None), total.n
+
+    def rolling_series(self, window, start_date, end_date):
+        """
+        [(date, mean)] of the `window`-day rolling mean for every day from
+        start_date to end_date that has entries in its window. O(days + window).
+        """
+        days = self.levels["day"]
+        start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+        count = total = 0
+        result = []
+        first = day = start - timedelta(days=window - 1)
+        while day <= end:
+            stats = days.get(day.isoformat())
+            if stats is not None:
+                count += stats.n
+                total += stats.mean * stats.n
+            leaving = day - timedelta(days=window)
+            leaving = days.get(leaving.isoformat()) if leaving >= first else None
+            if leaving is not None:
+                count -= leaving.n
+                total -= leaving.mean * leaving.n
+            if day >= start and count:
+                result.append((day.isoformat(), total / count))
+            day += timedelta(days=1)
+        return result
+
+    def hour_profile(self):
+        """[(hour, count, mean, std)] for every hour of the day that has entries."""
+        return [(hour, stats.n, stats.mean, stats.std) for hour, stats in enumerate(self.hours) if stats.n]
+
+    def to_json(self):
+        return json.dumps({
+            "signature": self.signature,
+            "levels": {level: {key: [s.n, s.mean, s.m2] for key, s in buckets.items()}
+                       for level, buckets in self.levels.items()},
+            "hours": [[s.n, s.mean, s.m2] for s in self.hours],
+        })
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        levels = {level: {key: RunningStats(*state) for key, state in data["levels"][level].items()}
+                  for level in STATISTICS_LEVELS}
+        hours = [RunningStats(*state) for state in data["hours"]]
+        if len(hours) != 24:
+            raise ValueError("expected 24 hours")
+        return cls(levels, hours, data["signature"])
+
+
+_statistics = {}
+
+
+def _statistics_path(storage_path):
+    return os.path.normpath(storage_path) + STATISTICS_SUFFIX
+
+
+def _statistics_log_path(storage_path):
+    return os.path.normpath(storage_path) + STATISTICS_LOG_SUFFIX
+
+
+def get_statistics(file_path=None):
+    """
+    Running statistics of the journal at file_path (default data file). Read
+    from the sidecar and its log when they still match the data, otherwise
+    rebuilt from one full read of the journal and saved.
+    """
+    file_path = file_path or default_data_path()
+    storage = get_storage(file_path)
+    signature = storage.signature()
+    statistics = _statistics.get(file_path)
+    if statistics is not None and statistics.signature == signature:
+        return statistics
+    sidecar, log_path = _statistics_path(file_path), _statistics_log_path(file_path)
+    statistics = _load_logged(sidecar, log_path, Statistics, signature)
+    if statistics is None or statistics.signature != signature:
+        with mornfeels_trace.span("aggregate.statistics"):
+            dates = storage.unique_dates()
+            statistics = Statistics.from_rows(storage.read_range(dates[0], dates[-1]) if dates else [])
+            statistics.signature = signature
+        if signature is not None:
+            _save_logged(sidecar, log_path, statistics)
+    _statistics[file_path] = statistics
+    return statistics
+
+
+# ---------------------- Note Index ----------------------------
+#
+# An inverted index from the lower-cased words of the notes to the entries
+# containing them, so "all entries mentioning coffee" is a dictionary lookup
+# instead of a scan of the journal. Only entries with a note (and a valid
+# date and value, as in MoodRecords) are indexed. Like the statistics, it
+# is built once per journal and kept, postings included, in a
+# "<data path>.notes.json" sidecar, with saved entries appended to a
+# "<data path>.notes.log" (see _log_rows()).
+
+
+_NOTE_WORD = re.compile(r"\w+")
+
+
+def note_words(text):
+    """The distinct lower-cased words of a note or query, in order of appearance."""
+    return list(dict.fromkeys(_NOTE_WORD.findall(text.lower())))
+
+
+class NoteIndex:
+    """
+    Word -> positions of the entries (in self.records) whose note contains it.
+    Positions are assigned in the order entries are added and never change.
+    """
+
+    def __init__(self, records=None, signature=None):
+        self.records = MoodRecords()     # the indexed entries, in the order added
+        self.postings = {}               # word -> array('i') of positions, ascending
+        self.signature = signature       # storage signature the index matches
+        self._words = None               # sorted vocabulary for prefix lookups
+        self.logged = 0                  # entries in the note log (not in the sidecar)
+        if records is not None:
+            self.add_records(records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def add_rows(self, rows):
+        """Index [date, time, value, note] rows; rows without a note are skipped."""
+        self.add_records(MoodRecords.from_rows(row for row in rows if len(row) > 3 and row[3]))
+
+    def add_records(self, records):
+        mine, postings = self.records, self.postings
+        position = len(mine)
+        for note in records.notes:
+            for word in note_words(note):
+                positions = postings.get(word)
+                if positions is None:
+                    positions = postings[word] = array('i')
+                    self._words = None
+                positions.append(position)
+            position += 1
+        mine.days.extend(records.days)
+        mine.seconds.extend(records.seconds)
+        mine.values.extend(records.values)
+        mine.notes.extend(records.notes)
+
+    def words(self, prefix):
+        """Indexed words starting with prefix."""
+        if self._words is None:
+            self._words = sorted(self.postings)
+        i = bisect_left(self._words, prefix)
+        j = bisect_left(self._words, prefix + "\U0010ffff")
+        return self._words[i:j]
+
+    def _positions(self, term, prefix):
+        if not prefix:
+            return set(self.postings.get(term, ()))
+        matches = [self.postings[word] for word in self.words(term)]
+        if len(matches) == 1:
+            return set(matches[0])
+        return set().union(*matches)
+
+    def search(self, query, start_date=None, end_date=None, values=None, prefix=True):
+        """
+        MoodRecords (date-sorted) of the entries whose note contains every word
+        of query, between start_date and end_date (inclusive, YYYY-MM-DD) and
+        with a mood in values (default: any). With prefix, "wor" also matches
+        "work" and "workout".
+        """
+        terms = note_words(query)
+        if not terms:
+            return MoodRecords()
+        # Intersect the rarest terms first
+        candidates = sorted((self._positions(term, prefix) for term in terms), key=len)
+        matches = candidates[0].intersection(*candidates[1:])
+        days, vals = self.records.days, self.records.values
+        if start_date or end_date:
+            first = date.fromisoformat(start_date).toordinal() if start_date else 0
+            last = date.fromisoformat(end_date).toordinal() if end_date else date.max.toordinal()
+            matches = [i for i in matches if first <= days[i] <= last]
+        if values is not None:
+            values = set(values)
+            matches = [i for i in matches if vals[i] in values]
+        # Positions are in insertion order, which is date order unless older entries came later
+        selected = self.records.select(sorted(matches))
+        if any(a > b for a, b in zip(selected.days, selected.days[1:])):
+            selected = selected._sorted()
+        return selected
+
+    def to_json(self):
+        records = self.records
+        return json.dumps({"signature": self.signature, "days": records.days.tolist(),
+                           "seconds": records.seconds.tolist(), "values": records.values.tolist(),
+                           "notes": records.notes,
+                           "postings": {word: positions.tolist() for word, positions in self.postings.items()}})
+
+    @classmethod
+    def from_json(cls, text):
+        # The postings are stored too, so loading does not tokenize every note again
+        data = json.loads(text)
+        index = cls(signature=data["signature"])
+        index.records = MoodRecords(array('i', data["days"]), array('i', data["seconds"]),
+                                    array('b', data["values"]), data["notes"])
+        index.postings = {word: array('i', positions) for word, positions in data["postings"].items()}
+        return index
+
+
+_note_indexes = {}
+
+
+def _note_index_path(storage_path):
+    return os.path.normpath(storage_path) + NOTE_INDEX_SUFFIX
+
+
+def _note_log_path(storage_path):
+    return os.path.normpath(storage_path) + NOTE_LOG_SUFFIX
+
+
+def get_note_index(file_path=None):
+    """
+    The note index of the journal at file_path (default data file). Read
+    from the sidecar and its log when they still match the data, otherwise
+    rebuilt from one full read of the journal and saved.
+    """
+    file_path = file_path or default_data_path()
+    storage = get_storage(file_path)
+    signature = storage.signature()
+    index = _note_indexes.get(file_path)
+    if index is not None and index.signature == signature:
+        return index
+    sidecar, log_path = _note_index_path(file_path), _note_log_path(file_path)
+    index = _load_logged(sidecar, log_path, NoteIndex, signature)
+    if index is None or index.signature != signature:
+        with mornfeels_trace.span("notes.index"):
+            index = NoteIndex(signature=signature)
+            dates = storage.unique_dates()
+            if dates:
+                index.add_rows(storage.read_range(dates[0], dates[-1]))
+        mornfeels_trace.count("notes.indexed", len(index))
+        if signature is not None:
+            _save_logged(sidecar, log_path, index)
+    _note_indexes[file_path] = index
+    return index
+
+
+def _logged_derived(file_path):
+    """(session cache, sidecar, log, class) of each kind of derived data with a log."""
+    return ((_statistics, _statistics_path(file_path), _statistics_log_path(file_path), Statistics),
+            (_note_indexes, _note_index_path(file_path), _note_log_path(file_path), NoteIndex))
+
+
+def retarget_derived(file_path, old_signature, new_signature):
+    """
+    After file_path was rewritten without changing any entry (compaction),
+    point the derived data that matched old_signature (session caches and
+    sidecars) at new_signature, so none of it is rebuilt from the journal.
+    """
+    rollups = _rollups.get(file_path)
+    if rollups is None or rollups.signature != old_signature:
+        rollups = _read_sidecar(_rollups_path(file_path), Rollups)
+    if rollups is not None and rollups.signature == old_signature:
+        rollups.signature = new_signature
+        _write_sidecar(_rollups_path(file_path), rollups)
+        _rollups[file_path] = rollups
+    for cache, sidecar, log_path, cls in _logged_derived(file_path):
+        derived = cache.get(file_path)
+        if derived is None or derived.signature != old_signature:
+            derived = _load_logged(sidecar, log_path, cls, old_signature)
+        if derived is not None and derived.signature == old_signature:
+            derived.signature = new_signature
+            _save_logged(sidecar, log_path, derived)
+            cache[file_path] = derived
+
+
+def search_notes(query, start_date=None, end_date=None, values=None, file_path=None):
+    """
+    Entries of file_path (default data file) whose note contains every word
+    of query (as word prefixes), optionally limited to a date range and to
+    some mood values. Returns date-sorted MoodRecords; their aggregate()
+    feeds the chart builders like aggregate_date_range() does.
+    """
+    index = get_note_index(file_path)
+    with mornfeels_trace.span("notes.search"):
+        matches = index.search(query, start_date, end_date, values)
+    mornfeels_trace.count("notes.matched", len(matches))
+    return matches
+
+
+def aggregate_date_range(start_date, end_date, file_path=None):
+    """
+    Aggregate file_path (default data file) between start_date and end_date (inclusive).
+    CSV: from the session's parsed records (NumPy arrays when available,
+    otherwise MoodRecords). SQLite: the aggregates are computed in SQL.
+    """
+    with mornfeels_trace.span("aggregate"):
+        return get_storage(file_path).aggregate_range(start_date, end_date)
+
+
+class Journal:
+    """
+    All entries of one data file, parsed once and then aggregated for any
+    number of date ranges (e.g. many weekly reports from the same journal).
+    SQLite journals are not preloaded: each range is one indexed SQL query.
+    """
+
+    def __init__(self, file_path=None):
+        self.file_path = file_path or default_data_path()
+        self._storage = get_storage(self.file_path)
+        self._records = None
+        if isinstance(self._storage, CsvStorage) and self._storage.segments() is None:
+            self._records = self._storage.records()
+
+    def unique_dates(self):
+        return self._storage.unique_dates()
+
+    def aggregate(self, start_date, end_date):
+        """aggregate_mood_data() for the entries between start_date and end_date (inclusive)."""
+        with mornfeels_trace.span("aggregate"):
+            if self._records is None:
+                return self._storage.aggregate_range(start_date, end_date)
+            selected = self._records.filter_range(start_date, end_date)
+            mornfeels_trace.count("aggregate.rows_matched", len(selected))
+            return selected.aggregate()
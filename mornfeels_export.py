@@ -0,0 +1,189 @@
+"""
+Streaming export of a Mornfeels journal to gzip CSV, JSON Lines or Parquet.
+
+An export is a pipeline of generator stages:
+
+    read_rows()     -> [date, time, value, note] rows from the storage backend,
+                       a block (CSV), segment (month) or fetch (SQLite) at a time
+    filter_rows()   -> keeps rows in the date range with a valid mood value
+                       (optionally only some values)
+    transform_rows()-> (date, "HH:MM:SS", int value, note) records
+    encoders        -> write the records in chunks of CHUNK_ROWS
+
+No stage holds more than one chunk, so memory use is the same for a week
+and for twenty years. The CSV output uses the journal's own format (and can
+be imported again); JSON Lines matches the import format. Parquet needs the
+optional pyarrow package.
+"""
+import os
+import io
+import csv
+import gzip
+import json
+from itertools import islice
+
+import mornfeels_core
+import mornfeels_trace
+
+# Records per chunk written (and per Parquet row group)
+CHUNK_ROWS = 10000
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+
+
+# ---------------------- Stages ----------------------------
+
+
+def read_rows(file_path, start_date, end_date):
+    """Stream the rows of file_path (default data file) between start_date and end_date."""
+    return mornfeels_core.get_storage(file_path).iter_range(start_date, end_date)
+
+
+def filter_rows(rows, start_date, end_date, values=None):
+    """Rows in the date range whose value is a mood value (and in values, if given)."""
+    allowed = {str(v) for v in (mornfeels_core.MOOD_COLORS if values is None else values)}
+    for row in rows:
+        if start_date <= row[0] <= end_date and row[2] in allowed:
+            yield row
+
+
+def transform_rows(rows):
+    """[date, time, value, note] strings -> (date, "HH:MM:SS", int value, note) records."""
+    for row in rows:
+        seconds = mornfeels_core._time_to_seconds(row[1])
+        h, rem = divmod(seconds, 3600)
+        yield (row[0], f"{h:02d}:{rem // 60:02d}:{rem % 60:02d}", int(row[2]),
+               row[3] if len(row) > 3 else "")
+
+
+def chunks(records, size=CHUNK_ROWS):
+    """Lists of up to size records."""
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ---------------------- Encoders ----------------------------
+#
+# Each encoder writes an iterable of records to a binary file object and
+# returns the number of records written.
+
+
+def _text(f):
+    return io.TextIOWrapper(f, encoding="utf-8", newline="")
+
+
+def encode_csv(records, f):
+    out = _text(f)
+    writer = csv.writer(out, delimiter=";")
+    writer.writerow(["Date", "Time", "Value", "Note"])
+    written = 0
+    for chunk in chunks(records):
+        writer.writerows(chunk)
+        written += len(chunk)
+        mornfeels_trace.count("export.chunks")
+    out.flush()
+    out.detach()
+    return written
+
+
+def encode_jsonl(records, f):
+    out = _text(f)
+    written = 0
+    for chunk in chunks(records):
+        out.write("".join(json.dumps({"date": d, "time": t, "value": v, "note": note},
+                                     ensure_ascii=False) + "\n"
+                          for d, t, v, note in chunk))
+        written += len(chunk)
+        mornfeels_trace.count("export.chunks")
+    out.flush()
+    out.detach()
+    return written
+
+
+def _pyarrow():
+    """(pyarrow, pyarrow.parquet), or None if pyarrow is not installed."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow, pyarrow.parquet
+
+
+def parquet_available():
+    return _pyarrow() is not None
+
+
+def encode_parquet(records, f):
+    """One row group per chunk, so only one chunk is ever held as columns."""
+    modules = _pyarrow()
+    if modules is None:
+        raise RuntimeError("Parquet export needs the pyarrow package (pip install pyarrow)")
+    pa, pq = modules
+    schema = pa.schema([("date", pa.string()), ("time", pa.string()),
+                        ("value", pa.int8()), ("note", pa.string())])
+    written = 0
+    with pq.ParquetWriter(f, schema, compression="zstd") as writer:
+        for chunk in chunks(records):
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema))
+            written += len(chunk)
+            mornfeels_trace.count("export.chunks")
+    return written
+
+
+ENCODERS = {"csv": encode_csv, "jsonl": encode_jsonl, "parquet": encode_parquet}
+
+
+# ---------------------- Export ----------------------------
+
+
+def detect_format(path):
+    """Format and gzip flag from the output name ("x.csv.gz" -> ("csv", True))."""
+    name = path.lower()
+    compressed = name.endswith(".gz")
+    if compressed:
+        name = name[:-3]
+    if name.endswith(".parquet"):
+        return "parquet", False
+    if name.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl", compressed
+    return "csv", compressed
+
+
+def export(output_path, start_date, end_date, file_path=None, fmt=None, compress=None, values=None):
+    """
+    Stream the entries of file_path (default data file) between start_date
+    and end_date (inclusive) to output_path. The format (and gzip for CSV and
+    JSON Lines) follows the output name unless given. The file is written
+    under a temporary name and renamed when complete. Returns the number of
+    entries written.
+    """
+    detected, gzipped = detect_format(output_path)
+    fmt = fmt or detected
+    if fmt not in ENCODERS:
+        raise ValueError(f"unknown export format {fmt!r} (use one of {', '.join(EXPORT_FORMATS)})")
+    if fmt == "parquet" and not parquet_available():
+        raise RuntimeError("Parquet export needs the pyarrow package (pip install pyarrow)")
+    compress = gzipped if compress is None else compress
+    records = transform_rows(filter_rows(read_rows(file_path, start_date, end_date),
+                                         start_date, end_date, values))
+    tmp_path = output_path + ".tmp"
+    try:
+        with mornfeels_trace.span("export"), open(tmp_path, mode="wb") as raw:
+            if compress and fmt != "parquet":
+                with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+                    written = ENCODERS[fmt](records, f)
+            else:
+                written = ENCODERS[fmt](records, raw)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    mornfeels_trace.count("export.rows", written)
+    return written
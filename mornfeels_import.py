@@ -0,0 +1,290 @@
+"""
+Bulk import of mood entries into a Mornfeels journal.
+
+Streams a CSV or JSON Lines file through validation in chunks and appends
+the new entries with mornfeels_core.save_entries(), one batch at a time: a
+single buffered write and fsync per batch, and the date index, statistics and
+note index updated once per batch. Entries whose (date, time) is already in
+the journal, or earlier in the input, are skipped. Memory use depends on
+the batch size, not on the size of the input.
+
+CSV input may use ";" or "," and may have a header naming the Date, Time,
+Value (or Mood) and Note columns; without one they are taken in that order.
+JSON Lines input has one object per line with "date", "time", "value" (or
+"mood") and an optional "note". Either may be gzip-compressed (".gz").
+"""
+import csv
+import gzip
+import json
+from bisect import bisect_left
+from datetime import date
+from itertools import islice
+
+import mornfeels_core
+import mornfeels_trace
+
+DEFAULT_BATCH_SIZE = 10000
+# How many rejected lines are reported back (the rest are only counted)
+MAX_REPORTED_ERRORS = 20
+JSONL_SUFFIXES = (".jsonl", ".ndjson", ".json")
+FIELDS = ("date", "time", "value", "note")
+FIELD_ALIASES = {"mood": "value"}
+
+
+class ImportInputError(ValueError):
+    """The input cannot be read at all (as opposed to single bad lines)."""
+
+
+# ---------------------- Readers ----------------------------
+#
+# Each reader yields (line number, [date, time, value, note]) for every input
+# record, with None for missing fields (or instead of the whole record when
+# a line is not a JSON object).
+
+
+def _field_name(name):
+    name = name.strip().lower()
+    return FIELD_ALIASES.get(name, name)
+
+
+def read_csv(f):
+    first = f.readline()
+    if not first:
+        return
+    delimiter = ";" if ";" in first else ","
+    header = next(csv.reader([first], delimiter=delimiter))
+    names = [_field_name(name) for name in header]
+    columns = [names.index(field) if field in names else None for field in FIELDS]
+    if "date" not in names:
+        # No header: the first line is already an entry
+        columns = list(range(len(FIELDS)))
+        yield 1, _pick(header, columns)
+    reader = csv.reader(f, delimiter=delimiter)
+    in_order = columns == list(range(len(FIELDS)))
+    for row in reader:
+        if not row:
+            continue
+        # +1 for the first line, read above
+        if in_order and len(row) >= len(FIELDS):
+            yield reader.line_num + 1, row
+        else:
+            yield reader.line_num + 1, _pick(row, columns)
+
+
+def _pick(row, columns):
+    return [row[i] if i is not None and i < len(row) else None for i in columns]
+
+
+def read_jsonl(f):
+    for line_no, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, None
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None
+            continue
+        fields = {_field_name(key): value for key, value in record.items()}
+        yield line_no, [fields.get(field) for field in FIELDS]
+
+
+def detect_format(path):
+    name = path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    return "jsonl" if name.endswith(JSONL_SUFFIXES) else "csv"
+
+
+# ---------------------- Validation ----------------------------
+
+
+# Mood values as CSV text or JSON numbers
+_MOODS = {**{str(v): v for v in mornfeels_core.MOOD_COLORS}, **{v: v for v in mornfeels_core.MOOD_COLORS}}
+
+
+def _check_present(record):
+    for name, field in zip(FIELDS, record):
+        if field is None and name != "note":
+            raise ValueError(f"missing {name}")
+
+
+def _check_scalars(record):
+    for name, field in zip(FIELDS, record):
+        if isinstance(field, (list, dict)):
+            raise ValueError(f"invalid {name} {field!r}")
+
+
+def _check_date(text):
+    """YYYY-MM-DD (surrounding blanks allowed) -> normalized date string."""
+    text = str(text).strip()
+    try:
+        if len(text) == 10:
+            return date.fromisoformat(text).isoformat()
+    except ValueError:
+        pass
+    raise ValueError(f"invalid date {text!r}")
+
+
+def _check_time(text):
+    """"H:MM", "HH:MM" or "HH:MM:SS" -> ("HH:MM:SS", seconds since midnight)."""
+    text = str(text).strip()
+    parts = text.split(":")
+    if (len(parts) not in (2, 3) or not all(part.isdigit() for part in parts)
+            or not all(len(part) == 2 for part in parts[1:])):
+        raise ValueError(f"invalid time {text!r}")
+    h, m, sec = (int(part) for part in parts + ["0"] * (3 - len(parts)))
+    if h > 23 or m > 59 or sec > 59:
+        raise ValueError(f"invalid time {text!r}")
+    return f"{h:02d}:{m:02d}:{sec:02d}", h * 3600 + m * 60 + sec
+
+
+def _check_value(value):
+    if not isinstance(value, bool):
+        try:
+            mood = int(str(value).strip())
+        except ValueError:
+            mood = None
+        if mood in mornfeels_core.MOOD_COLORS:
+            return mood
+    raise ValueError(f"invalid value {value!r}")
+
+
+class Validator:
+    """
+    Turns input records into [date, time, value, note] rows, or raises
+    ValueError. Valid dates and times are remembered, so each distinct one
+    is parsed once (both caches are bounded by the days in the input and
+    the seconds in a day).
+    """
+
+    def __init__(self):
+        self._dates = {}   # date text -> normalized date
+        self._times = {}   # time text -> (normalized time, seconds)
+
+    def row(self, record):
+        """([date, "HH:MM:SS", value, note], seconds) of one record."""
+        if record is None:
+            raise ValueError("not a JSON object")
+        date_text, time_text, value, note = record[0], record[1], record[2], record[3]
+        try:
+            date_str = self._dates.get(date_text)
+            checked = self._times.get(time_text)
+            mood = _MOODS.get(value)
+        except TypeError:
+            # A JSON list or object (unhashable) in place of a field
+            _check_scalars(record)
+            raise
+        if date_str is None:
+            _check_present(record)
+            date_str = self._dates[date_text] = _check_date(date_text)
+        if checked is None:
+            _check_present(record)
+            checked = self._times[time_text] = _check_time(time_text)
+        if mood is None or value is True or value is False:
+            _check_present(record)
+            mood = _check_value(value)
+        if note.__class__ is not str:
+            note = "" if note is None else str(note)
+        if "\n" in note or "\r" in note:
+            # The data files are read line by line, so notes must stay on one line
+            note = note.replace("\r\n", " ").replace("\n", " ").replace("\r", " ")
+        return [date_str, checked[0], mood, note], checked[1]
+
+
+# ---------------------- Import ----------------------------
+
+
+def _existing_keys(storage, dates):
+    """(date, seconds) of the journal's entries on the given dates."""
+    if not storage.exists():
+        return set()
+    keys = set()
+    for start_date, end_date in _journal_runs(storage.unique_dates(), dates):
+        for row in storage.iter_range(start_date, end_date):
+            keys.add((row[0], mornfeels_core._time_to_seconds(row[1])))
+    return keys
+
+
+def _journal_runs(journal_dates, dates):
+    """
+    (first, last) of each run of the given dates that follow each other in
+    the sorted journal_dates, so only those days are read back (none, for
+    new history) however scattered the batch is.
+    """
+    positions = sorted(bisect_left(journal_dates, d) for d in dates)
+    runs = []
+    for i in positions:
+        if i == len(journal_dates) or journal_dates[i] not in dates:
+            continue
+        if runs and runs[-1][1] == i - 1:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+    return [(journal_dates[first], journal_dates[last]) for first, last in runs]
+
+
+def import_records(records, file_path=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Validate, deduplicate and append (line number, record) pairs to the
+    journal at file_path (default data file), batch_size at a time.
+    Returns {"read", "imported", "duplicates", "invalid", "errors"}, where
+    errors lists the first MAX_REPORTED_ERRORS "line N: reason" messages.
+    """
+    file_path = file_path or mornfeels_core.default_data_path()
+    storage = mornfeels_core.get_storage(file_path)
+    storage.init()
+    validator = Validator()
+    stats = {"read": 0, "imported": 0, "duplicates": 0, "invalid": 0, "errors": []}
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, batch_size))
+        if not chunk:
+            break
+        with mornfeels_trace.span("import.batch"):
+            stats["read"] += len(chunk)
+            checked = []
+            for line_no, record in chunk:
+                try:
+                    checked.append(validator.row(record))
+                except ValueError as e:
+                    stats["invalid"] += 1
+                    if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+                        stats["errors"].append(f"line {line_no}: {e}")
+            if not checked:
+                continue
+            # Earlier batches are in the journal by now, so this also catches
+            # repeats across batches
+            seen = _existing_keys(storage, {row[0] for row, _ in checked})
+            batch = []
+            for row, seconds in checked:
+                key = (row[0], seconds)
+                if key in seen:
+                    stats["duplicates"] += 1
+                    continue
+                seen.add(key)
+                batch.append(row)
+            if batch:
+                mornfeels_core.save_entries(file_path, batch)
+                stats["imported"] += len(batch)
+        mornfeels_trace.count("import.rows", len(chunk))
+    mornfeels_trace.count("import.imported", stats["imported"])
+    return stats
+
+
+def import_file(input_path, file_path=None, fmt=None, batch_size=DEFAULT_BATCH_SIZE):
+    """import_records() of a CSV or JSON Lines file (format from the suffix unless given)."""
+    fmt = fmt or detect_format(input_path)
+    if fmt not in ("csv", "jsonl"):
+        raise ImportInputError(f"unknown input format {fmt!r} (use csv or jsonl)")
+    opener = gzip.open if input_path.lower().endswith(".gz") else open
+    with opener(input_path, mode='rt', newline='', encoding='utf-8-sig') as f:
+        records = read_jsonl(f) if fmt == "jsonl" else read_csv(f)
+        try:
+            return import_records(records, file_path, batch_size)
+        except UnicodeDecodeError:
+            raise ImportInputError(f"{input_path} is not UTF-8 text")
+        except (gzip.BadGzipFile, EOFError):
+            raise ImportInputError(f"{input_path} is not a complete gzip file")
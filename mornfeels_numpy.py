@@ -0,0 +1,217 @@
+"""
+Optional NumPy analysis backend for Mornfeels.
+
+Loads the Date/Time/Value columns of a mood CSV into compact typed arrays
+(datetime64[D] dates, int32 seconds-of-day, int8 values) and computes the
+aggregates used by the chart builders with vectorized operations.
+Requires NumPy (pip install numpy); mornfeels.py falls back to the pure
+Python path when it is missing.
+"""
+import csv
+import io
+import threading
+from datetime import date
+
+import numpy as np
+
+import mornfeels_core
+import mornfeels_trace
+
+class MoodArrays:
+    """Date-sorted, column-oriented mood entries backed by NumPy arrays."""
+
+    def __init__(self, dates, seconds, values):
+        self.dates = dates        # datetime64[D]
+        self.seconds = seconds    # int32 seconds since midnight
+        self.values = values      # int8 mood values
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def nbytes(self):
+        return self.dates.nbytes + self.seconds.nbytes + self.values.nbytes
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype="datetime64[D]"),
+                   np.empty(0, dtype=np.int32),
+                   np.empty(0, dtype=np.int8))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build arrays from CSV rows ([date, time, value, ...])."""
+        date_strs, time_strs, value_strs = [], [], []
+        for row in rows:
+            if len(row) >= 3:
+                date_strs.append(row[0])
+                time_strs.append(row[1])
+                value_strs.append(row[2])
+        try:
+            dates, seconds, values = _convert_columns(date_strs, time_strs, value_strs)
+        except ValueError:
+            # Slow path: drop the rows that do not parse, like the Python backend
+            dates, seconds, values = _convert_columns(*_valid_columns(date_strs, time_strs, value_strs))
+        if len(dates) > 1 and (np.diff(dates) < np.timedelta64(0, "D")).any():
+            # Stable, so rows keep their file order within a day
+            order = np.argsort(dates, kind="stable")
+            dates, seconds, values = dates[order], seconds[order], values[order]
+        return cls(dates, seconds, values)
+
+    def concat(self, other):
+        """Return self followed by other, re-sorted by date if needed."""
+        if not len(other):
+            return self
+        if not len(self):
+            return other
+        dates = np.concatenate([self.dates, other.dates])
+        seconds = np.concatenate([self.seconds, other.seconds])
+        values = np.concatenate([self.values, other.values])
+        if other.dates[0] < self.dates[-1]:
+            order = np.argsort(dates, kind="stable")
+            dates, seconds, values = dates[order], seconds[order], values[order]
+        return MoodArrays(dates, seconds, values)
+
+    # -- queries --
+
+    def filter_range(self, start_date, end_date):
+        """Entries between start_date and end_date (inclusive) as array views."""
+        lo = np.searchsorted(self.dates, np.datetime64(start_date, "D"), side="left")
+        hi = np.searchsorted(self.dates, np.datetime64(end_date, "D"), side="right")
+        return MoodArrays(self.dates[lo:hi], self.seconds[lo:hi], self.values[lo:hi])
+
+    def histogram(self):
+        """Frequency of each mood value as an array indexed by value."""
+        if not len(self):
+            return np.zeros(0, dtype=np.int64)
+        return np.bincount(self.values.astype(np.intp))
+
+    def aggregate(self):
+        """
+        Same shape as mornfeels.aggregate_mood_data(), computed vectorized,
+        so the existing chart builders can consume it directly.
+        """
+        days, inverse, counts = np.unique(self.dates, return_inverse=True, return_counts=True)
+        sums = np.bincount(inverse, weights=self.values, minlength=len(days)).astype(np.int64)
+        width = int(self.values.max()) + 1 if len(self) else 0
+        per_day = np.bincount(inverse * width + self.values,
+                              minlength=len(days) * width).reshape(len(days), width)
+        date_strs = np.datetime_as_string(days, unit="D").tolist()
+        hist = self.histogram()
+        return {
+            "dates": date_strs,
+            "daily_count": dict(zip(date_strs, counts.tolist())),
+            "daily_sum": dict(zip(date_strs, sums.tolist())),
+            "daily_hist": {
+                d: {v: c for v, c in enumerate(row) if c}
+                for d, row in zip(date_strs, per_day.tolist())
+            },
+            "hist": {v: c for v, c in enumerate(hist.tolist()) if c},
+        }
+
+
+def _convert_columns(date_strs, time_strs, value_strs):
+    """Vectorized string -> typed array conversion. Raises ValueError on bad input."""
+    dates = _parse_dates(date_strs)
+    try:
+        # Full-width strings: int() semantics, so "00003" is 3 like in Python
+        values = np.array(value_strs, dtype=str).astype(np.int64)
+    except OverflowError:
+        raise ValueError("mood value out of range")
+    if len(values) and (values.min() < 0 or values.max() > mornfeels_core.MAX_MOOD_VALUE):
+        raise ValueError("mood value out of range")
+    return dates, _parse_times(time_strs), values.astype(np.int8)
+
+
+def _parse_dates(date_strs):
+    """
+    Parse "YYYY-MM-DD" strings into datetime64[D]. Anything else raises
+    ValueError: NumPy alone would also take "2025-01" or " 2025-01-01",
+    which the Python backend skips. Each distinct date is checked once.
+    """
+    for text in set(date_strs):
+        if len(text) != 10 or date.fromisoformat(text).isoformat() != text:
+            raise ValueError(f"invalid date {text!r}")
+    return np.array(date_strs, dtype="datetime64[D]")
+
+
+def _parse_times(time_strs):
+    """Parse "HH:MM" / "HH:MM:SS" strings into seconds since midnight."""
+    if not time_strs:
+        return np.empty(0, dtype=np.int32)
+    # View the fixed-width ASCII strings as a byte matrix and read the digits;
+    # one byte more than "HH:MM:SS" shows whether a string was cut off
+    try:
+        raw = np.array(time_strs, dtype="S9")
+    except UnicodeEncodeError:
+        # Non-ASCII times (e.g. full-width digits) are left blank here and
+        # take the slow path below
+        raw = np.array([t if t.isascii() else "" for t in time_strs], dtype="S9")
+    digits = raw.view(np.uint8).reshape(len(raw), 9).astype(np.int32) - ord("0")
+    seconds = (digits[:, 0] * 10 + digits[:, 1]) * 3600 + (digits[:, 3] * 10 + digits[:, 4]) * 60
+    has_seconds = digits[:, 5] == ord(":") - ord("0")
+    seconds += np.where(has_seconds, digits[:, 6] * 10 + digits[:, 7], 0)
+    padding = -ord("0")
+    is_digit = (digits >= 0) & (digits <= 9)
+    clean = (is_digit[:, [0, 1, 3, 4]].all(axis=1) & (digits[:, 2] == ord(":") - ord("0"))
+             & (digits[:, 8] == padding)
+             # "HH:MM" or "HH:MM:SS", nothing else
+             & (((digits[:, 5] == padding) & (digits[:, 6] == padding) & (digits[:, 7] == padding))
+                | (has_seconds & is_digit[:, 6] & is_digit[:, 7])))
+    for i in np.flatnonzero(~clean):
+        # Odd formats such as "8:00" go through the slow path
+        seconds[i] = mornfeels_core._time_to_seconds(time_strs[i])
+    return seconds.astype(np.int32)
+
+
+def _valid_columns(date_strs, time_strs, value_strs):
+    """The rows the Python backend keeps, with dates normalized to YYYY-MM-DD."""
+    keep_d, keep_t, keep_v = [], [], []
+    for d, t, v in zip(date_strs, time_strs, value_strs):
+        try:
+            d = date.fromisoformat(d).isoformat()
+            if not 0 <= int(v) <= mornfeels_core.MAX_MOOD_VALUE:
+                continue
+        except ValueError:
+            continue
+        keep_d.append(d)
+        keep_t.append(t)
+        keep_v.append(str(int(v)))
+    return keep_d, keep_t, keep_v
+
+
+# ---------------------- Session cache ----------------------------
+
+
+class _CachedArrays:
+    def __init__(self, file_path):
+        self.arrays = MoodArrays.empty()
+        self.reader = mornfeels_core.TailReader(file_path)
+        self.lock = threading.Lock()
+
+
+_cache = {}
+
+
+def load_mood_arrays(file_path):
+    """
+    Return MoodArrays for file_path, loaded once per session.
+    When the file only grew (new entries appended), just the new bytes are
+    parsed; a truncated or rewritten file is reloaded in full.
+    """
+    entry = _cache.get(file_path)
+    if entry is None:
+        entry = _cache.setdefault(file_path, _CachedArrays(file_path))
+    with entry.lock:
+        data, full = entry.reader.read()
+        if not data and not full:
+            return entry.arrays
+        with mornfeels_trace.span("load.arrays"):
+            reader = csv.reader(io.StringIO(data.decode("utf-8")), delimiter=";")
+            if full:
+                next(reader, None)
+                entry.arrays = MoodArrays.from_rows(reader)
+            else:
+                entry.arrays = entry.arrays.concat(MoodArrays.from_rows(reader))
+        mornfeels_trace.count("load.rows_parsed", reader.line_num)
+        return entry.arrays
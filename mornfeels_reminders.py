@@ -0,0 +1,125 @@
+"""
+Daily reminder scheduling for Mornfeels, independent of the UI toolkit.
+
+The next fire time of every reminder is kept in a min-heap, and exactly one
+one-shot timer is armed, for the earliest of them. When it fires, every due
+reminder is reported at once (several missed ones after sleep become a
+single prompt), each is pushed back with its next daily occurrence, and the
+single timer is re-armed. No periodic timers, no polling.
+"""
+import heapq
+from datetime import datetime, timedelta
+
+# A reminder reported this much later than planned counts as missed
+MISSED_AFTER = timedelta(minutes=5)
+
+
+def next_occurrence(hour, minute, after):
+    """First datetime strictly after `after` at hour:minute (today or a later day)."""
+    candidate = after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if candidate <= after:
+        candidate += timedelta(days=1)
+    return candidate
+
+
+class ReminderScheduler:
+    """
+    Fires on_fire(due) for daily (hour, minute) reminders.
+    schedule_once(callback, delay_seconds) must arm a one-shot timer and
+    return an object with cancel() (Kivy's Clock.schedule_once does).
+    due is a list of (scheduled datetime, missed) in time order.
+    """
+
+    def __init__(self, times, on_fire, schedule_once, now=datetime.now):
+        self.on_fire = on_fire
+        self._schedule_once = schedule_once
+        self._now = now
+        self._heap = []        # (next fire datetime, sequence, (hour, minute))
+        self._live = {}        # (hour, minute) -> sequence of its current heap entry
+        self._sequence = 0
+        self._event = None     # the one armed timer
+        self.set_times(times)
+
+    @property
+    def times(self):
+        return sorted(self._live)
+
+    def next_fire_time(self):
+        """When the armed timer will report the next reminder (None if there are none)."""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    # -- editing --
+
+    def _push(self, hm, fire_time):
+        self._sequence += 1
+        self._live[hm] = self._sequence
+        heapq.heappush(self._heap, (fire_time, self._sequence, hm))
+
+    def set_times(self, times):
+        """Replace all reminder times and re-arm."""
+        now = self._now()
+        self._heap = []
+        self._live = {}
+        for hour, minute in set(times):
+            self._push((hour, minute), next_occurrence(hour, minute, now))
+        self._arm()
+
+    def add_time(self, hour, minute):
+        if (hour, minute) in self._live:
+            return
+        self._push((hour, minute), next_occurrence(hour, minute, self._now()))
+        self._arm()
+
+    def remove_time(self, hour, minute):
+        # Its heap entry is dropped lazily when it reaches the top
+        self._live.pop((hour, minute), None)
+        self._arm()
+
+    def cancel(self):
+        """Disarm the timer (e.g. when the app stops)."""
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+
+    # -- firing --
+
+    def _is_live(self, entry):
+        return self._live.get(entry[2]) == entry[1]
+
+    def _drop_stale(self):
+        while self._heap and not self._is_live(self._heap[0]):
+            heapq.heappop(self._heap)
+
+    def _arm(self):
+        self.cancel()
+        self._drop_stale()
+        if not self._heap:
+            return
+        delay = (self._heap[0][0] - self._now()).total_seconds()
+        self._event = self._schedule_once(self._on_timer, max(delay, 0))
+
+    def _on_timer(self, *args):
+        self._event = None
+        self.check()
+
+    def check(self):
+        """
+        Report everything due by now and re-arm. Called by the timer, and
+        safe to call any time (e.g. when the app resumes after sleep).
+        """
+        now = self._now()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if not self._is_live(entry):
+                continue
+            fire_time, _, (hour, minute) = entry
+            due.append((fire_time, now - fire_time > MISSED_AFTER))
+            # Day rollover: the next one is tomorrow's (or later, after a long sleep)
+            self._push((hour, minute), next_occurrence(hour, minute, now))
+        self._arm()
+        if due:
+            due.sort()
+            self.on_fire(due)
+        return due
@@ -0,0 +1,482 @@
+"""
+Compressed, checksummed monthly segments for old Mornfeels history.
+
+compact() moves the rows of closed months out of a data CSV into one
+segment file per month under "<data file>.segments/". CsvStorage reads the
+segments transparently alongside the live CSV, so the live file (and every
+scan of it) only holds the current month plus late additions.
+
+Segment file layout:
+
+    MAGIC | uint32 meta length | uint32 CRC-32 of meta | meta (JSON) | payload
+
+The meta holds the month, codec, row count, CRC-32 of the uncompressed
+payload and the per-day value histograms, so date listings and aggregates
+never decompress anything. The payload is the zlib- or lzma-compressed
+binary row encoding below. Every row round-trips to exactly the text it had
+in the CSV, notes included.
+
+Row encoding (one kind byte, then):
+    ROW_HM / ROW_HMS   day, hour, minute[, second] bytes, int8 value,
+                       and a length-prefixed note if NOTE_FLAG is set
+    ROW_RAW            field count, then each field length-prefixed
+                       (anything not in canonical form)
+"""
+import os
+import io
+import csv
+import json
+import lzma
+import zlib
+import struct
+import threading
+from datetime import date
+
+import mornfeels_core
+import mornfeels_trace
+
+MAGIC = b"MFSEG\x01"
+SEGMENT_SUFFIX = ".seg"
+CODECS = ("zlib", "lzma")
+DEFAULT_CODEC = "zlib"
+# compact() stages its output under these names until it commits
+STAGED_SUFFIX = ".new"
+STAGED_CSV_SUFFIX = ".compact"
+PENDING_MARKER = "compact.pending"
+
+ROW_HM = 0
+ROW_HMS = 1
+ROW_RAW = 2
+NOTE_FLAG = 0x80
+
+_HEADER = struct.Struct("<II")
+_HM = struct.Struct("<BBBb")
+_HMS = struct.Struct("<BBBBb")
+
+
+class SegmentError(ValueError):
+    """A segment file is damaged (bad magic, checksum or encoding)."""
+
+
+# ---------------------- Row Encoding ----------------------------
+
+
+def _put_bytes(out, data):
+    """Varint length (LEB128) followed by the bytes."""
+    n = len(data)
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    out += data
+
+
+def _get_bytes(buf, pos):
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            break
+        shift += 7
+    return buf[pos:pos + n], pos + n
+
+
+def _two_digits(text):
+    return len(text) == 2 and text.isascii() and text.isdigit()
+
+
+def _encode_row(out, row, month):
+    """Append one row; canonical rows take 5-6 bytes plus the note."""
+    if 3 <= len(row) <= 4 and len(row[0]) == 10 and row[0].startswith(month) and row[0][7] == "-":
+        d_str, t_str, v_str = row[0], row[1], row[2]
+        parts = t_str.split(":")
+        try:
+            value = int(v_str)
+        except ValueError:
+            value = None
+        if (value is not None and str(value) == v_str and -128 <= value <= 127
+                and _two_digits(d_str[8:]) and len(parts) in (2, 3) and all(map(_two_digits, parts))):
+            flag = NOTE_FLAG if len(row) == 4 else 0
+            day = int(d_str[8:])
+            if len(parts) == 2:
+                out.append(ROW_HM | flag)
+                out += _HM.pack(day, int(parts[0]), int(parts[1]), value)
+            else:
+                out.append(ROW_HMS | flag)
+                out += _HMS.pack(day, int(parts[0]), int(parts[1]), int(parts[2]), value)
+            if flag:
+                _put_bytes(out, row[3].encode("utf-8"))
+            return
+    out.append(ROW_RAW)
+    _put_bytes(out, str(len(row)).encode("ascii"))
+    for field in row:
+        _put_bytes(out, field.encode("utf-8"))
+
+
+def encode_rows(rows, month):
+    """Binary encoding of the rows of one month ("YYYY-MM")."""
+    out = bytearray()
+    for row in rows:
+        _encode_row(out, row, month)
+    return bytes(out)
+
+
+def decode_rows(payload, month):
+    """Inverse of encode_rows(): the rows as lists of strings, in their original order."""
+    rows = []
+    pos = 0
+    end = len(payload)
+    prefix = month + "-"
+    try:
+        while pos < end:
+            kind = payload[pos]
+            pos += 1
+            base = kind & ~NOTE_FLAG
+            if base == ROW_HM:
+                day, h, m, value = _HM.unpack_from(payload, pos)
+                pos += _HM.size
+                row = [f"{prefix}{day:02d}", f"{h:02d}:{m:02d}", str(value)]
+            elif base == ROW_HMS:
+                day, h, m, sec, value = _HMS.unpack_from(payload, pos)
+                pos += _HMS.size
+                row = [f"{prefix}{day:02d}", f"{h:02d}:{m:02d}:{sec:02d}", str(value)]
+            elif base == ROW_RAW:
+                count, pos = _get_bytes(payload, pos)
+                row = []
+                for _ in range(int(count)):
+                    field, pos = _get_bytes(payload, pos)
+                    row.append(field.decode("utf-8"))
+                rows.append(row)
+                continue
+            else:
+                raise SegmentError(f"unknown row kind {kind}")
+            if kind & NOTE_FLAG:
+                note, pos = _get_bytes(payload, pos)
+                row.append(note.decode("utf-8"))
+            rows.append(row)
+    except (IndexError, struct.error, UnicodeDecodeError, ValueError) as e:
+        raise SegmentError(f"damaged segment payload: {e}")
+    return rows
+
+
+# ---------------------- Segment Files ----------------------------
+
+
+def _compress(payload, codec):
+    if codec == "lzma":
+        return lzma.compress(payload, preset=6)
+    return zlib.compress(payload, 9)
+
+
+def _decompress(data, codec):
+    try:
+        if codec == "lzma":
+            return lzma.decompress(data)
+        return zlib.decompress(data)
+    except (lzma.LZMAError, zlib.error) as e:
+        raise SegmentError(f"cannot decompress segment: {e}")
+
+
+def _daily_histograms(rows):
+    """{date: {value: count}} of the rows, counted like the live file's record store."""
+    daily = mornfeels_core.MoodRecords.from_rows(rows).aggregate()["daily_hist"]
+    return {d: sorted(hist.items()) for d, hist in daily.items()}
+
+
+def write_segment(path, month, rows, codec=DEFAULT_CODEC):
+    """Write the rows of one month to a segment file (atomically)."""
+    if codec not in CODECS:
+        raise ValueError(f"unknown codec {codec!r} (choose from {', '.join(CODECS)})")
+    payload = encode_rows(rows, month)
+    compressed = _compress(payload, codec)
+    meta = json.dumps({
+        "format": 1,
+        "month": month,
+        "codec": codec,
+        "rows": len(rows),
+        "raw_bytes": len(payload),
+        "crc32": zlib.crc32(payload),
+        "daily": _daily_histograms(rows),
+    }, separators=(",", ":")).encode("utf-8")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, mode="wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER.pack(len(meta), zlib.crc32(meta)))
+        f.write(meta)
+        f.write(compressed)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read_meta(f, path):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise SegmentError(f"{path} is not a segment file")
+    header = f.read(_HEADER.size)
+    if len(header) != _HEADER.size:
+        raise SegmentError(f"{path} is truncated")
+    meta_len, meta_crc = _HEADER.unpack(header)
+    meta_bytes = f.read(meta_len)
+    if zlib.crc32(meta_bytes) != meta_crc:
+        raise SegmentError(f"{path}: meta checksum mismatch")
+    meta = json.loads(meta_bytes.decode("utf-8"))
+    meta["daily"] = {d: {int(v): n for v, n in pairs} for d, pairs in meta["daily"].items()}
+    return meta
+
+
+def read_segment_meta(path):
+    """The meta dict of a segment (daily histograms as {date: {value: count}})."""
+    with open(path, mode="rb") as f:
+        return _read_meta(f, path)
+
+
+def read_segment_rows(path):
+    """All rows of a segment, after verifying its checksum."""
+    with open(path, mode="rb") as f:
+        meta = _read_meta(f, path)
+        compressed = f.read()
+    mornfeels_trace.count("segments.bytes_read", len(compressed))
+    payload = _decompress(compressed, meta["codec"])
+    if zlib.crc32(payload) != meta["crc32"] or len(payload) != meta["raw_bytes"]:
+        raise SegmentError(f"{path}: payload checksum mismatch")
+    rows = decode_rows(payload, meta["month"])
+    if len(rows) != meta["rows"]:
+        raise SegmentError(f"{path}: expected {meta['rows']} rows, found {len(rows)}")
+    mornfeels_trace.count("segments.rows_decoded", len(rows))
+    return rows
+
+
+# ---------------------- Segment Store ----------------------------
+
+
+class SegmentStore:
+    """The segments of one data CSV, with their metas cached per session."""
+
+    def __init__(self, data_path):
+        self.data_path = data_path
+        self.directory = data_path + mornfeels_core.SEGMENTS_SUFFIX
+        self._metas = {}          # month -> (mtime_ns, meta)
+        self._months = []
+        self._listed_mtime = None
+        self._lock = threading.Lock()
+
+    def path_for(self, month):
+        return os.path.join(self.directory, month + SEGMENT_SUFFIX)
+
+    def months(self):
+        """Sorted months that have a segment (re-listed only when the directory changes)."""
+        with self._lock:
+            try:
+                mtime = os.stat(self.directory).st_mtime_ns
+            except OSError:
+                self._months, self._listed_mtime = [], None
+                return []
+            if mtime != self._listed_mtime:
+                self._months = sorted(name[:-len(SEGMENT_SUFFIX)] for name in os.listdir(self.directory)
+                                      if name.endswith(SEGMENT_SUFFIX))
+                self._listed_mtime = mtime
+            return list(self._months)
+
+    def meta(self, month):
+        path = self.path_for(month)
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._metas.get(month)
+        if cached is None or cached[0] != mtime:
+            cached = self._metas[month] = (mtime, read_segment_meta(path))
+        return cached[1]
+
+    def signature(self):
+        return [[month, os.stat(self.path_for(month)).st_mtime_ns] for month in self.months()]
+
+    def _overlapping(self, start_date, end_date):
+        return [month for month in self.months() if start_date[:7] <= month <= end_date[:7]]
+
+    def unique_dates(self):
+        dates = []
+        for month in self.months():
+            dates.extend(self.meta(month)["daily"])
+        return sorted(dates)
+
+    def iter_range(self, start_date, end_date):
+        """The rows between start_date and end_date, decoding one segment (month) at a time."""
+        for month in self._overlapping(start_date, end_date):
+            for row in read_segment_rows(self.path_for(month)):
+                if start_date <= row[0] <= end_date:
+                    yield row
+
+    def read_range(self, start_date, end_date):
+        return list(self.iter_range(start_date, end_date))
+
+    def aggregate_range(self, start_date, end_date):
+        """aggregate_mood_data() shape, straight from the segment metas (no decompression)."""
+        daily_hist = {}
+        for month in self._overlapping(start_date, end_date):
+            for d, hist in self.meta(month)["daily"].items():
+                if start_date <= d <= end_date:
+                    daily_hist[d] = dict(hist)
+        hist = {}
+        for day_hist in daily_hist.values():
+            for val, n in day_hist.items():
+                hist[val] = hist.get(val, 0) + n
+        return {
+            "dates": sorted(daily_hist),
+            "daily_count": {d: sum(h.values()) for d, h in daily_hist.items()},
+            "daily_sum": {d: sum(v * n for v, n in h.items()) for d, h in daily_hist.items()},
+            "daily_hist": daily_hist,
+            "hist": hist,
+        }
+
+
+_stores = {}
+
+
+def get_segment_store(data_path):
+    store = _stores.get(data_path)
+    if store is None:
+        store = _stores.setdefault(data_path, SegmentStore(data_path))
+    return store
+
+
+# ---------------------- Compaction ----------------------------
+
+
+def _row_month(row):
+    """"YYYY-MM" of a row with a valid date, else None."""
+    if len(row) < 3:
+        return None
+    try:
+        date.fromisoformat(row[0])
+    except ValueError:
+        return None
+    return row[0][:7]
+
+
+def _fsync_write(path, data, mode="wb"):
+    with open(path, mode=mode) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _carry_over(data_path, staged_csv, offset, inode):
+    """
+    Append whatever was written to data_path past offset (entries saved
+    while compacting) to the staged CSV. Returns the new offset. Raises
+    SegmentError if data_path was replaced or shrank meanwhile.
+    """
+    while True:
+        stat = os.stat(data_path)
+        if stat.st_ino != inode or stat.st_size < offset:
+            raise SegmentError(f"{data_path} was rewritten during compaction")
+        if stat.st_size == offset:
+            return offset
+        with open(data_path, mode="rb") as f:
+            f.seek(offset)
+            extra = f.read(stat.st_size - offset)
+        _fsync_write(staged_csv, extra, mode="ab")
+        offset += len(extra)
+
+
+def _publish(data_path, store, months):
+    """
+    Move the staged segments and live CSV of a committed compaction into
+    place (with the data file locked). No entry changed, so derived data
+    that was up to date is pointed at the new storage signature.
+    """
+    storage = mornfeels_core.get_storage(data_path)
+    signature = storage.signature()
+    for month in months:
+        staged = store.path_for(month) + STAGED_SUFFIX
+        if os.path.exists(staged):
+            os.replace(staged, store.path_for(month))
+    staged_csv = data_path + STAGED_CSV_SUFFIX
+    if os.path.exists(staged_csv):
+        os.replace(staged_csv, data_path)
+    os.remove(os.path.join(store.directory, PENDING_MARKER))
+    mornfeels_core.retarget_derived(data_path, signature, storage.signature())
+
+
+def _recover(data_path, store):
+    """
+    Finish or undo a compaction that stopped half-way. With the marker, it
+    had committed: entries appended since are carried over and the staged
+    files published. Without it, the staged files are dropped, so a re-run
+    never merges the same rows into a segment twice.
+    """
+    marker = os.path.join(store.directory, PENDING_MARKER)
+    if os.path.exists(marker):
+        with open(marker, mode="r", encoding="utf-8") as f:
+            pending = json.load(f)
+        staged_csv = data_path + STAGED_CSV_SUFFIX
+        with mornfeels_core.data_file_lock(data_path):
+            if os.path.exists(staged_csv):
+                _carry_over(data_path, staged_csv, pending["offset"], pending["inode"])
+            _publish(data_path, store, pending["months"])
+        return
+    if os.path.exists(data_path + STAGED_CSV_SUFFIX):
+        os.remove(data_path + STAGED_CSV_SUFFIX)
+    if os.path.isdir(store.directory):
+        for name in os.listdir(store.directory):
+            if name.endswith(SEGMENT_SUFFIX + STAGED_SUFFIX):
+                os.remove(os.path.join(store.directory, name))
+
+
+def compact(data_path, codec=DEFAULT_CODEC, before_month=None):
+    """
+    Move the rows of closed months (before before_month, default the current
+    month) from the CSV at data_path into segments, merging with existing
+    segments of the same month. The live CSV keeps the header, the open
+    months and any row without a valid date. Returns {month: rows moved}.
+
+    New segments and the new live CSV are staged first, and entries appended
+    to the CSV meanwhile are carried over. Then, holding the data file lock
+    (so saves wait instead of writing to the old file), the last appends are
+    carried over, a marker commits the compaction and the staged files are
+    renamed into place. A compaction that was interrupted is finished (or
+    undone) by the next call.
+    """
+    before_month = before_month or date.today().isoformat()[:7]
+    store = get_segment_store(data_path)
+    _recover(data_path, store)
+    with open(data_path, mode="rb") as f:
+        inode = os.fstat(f.fileno()).st_ino
+        data = f.read()
+    # Complete lines only; a row being written is carried over with later appends
+    offset = data.rfind(b"\n") + 1
+    reader = csv.reader(io.StringIO(data[:offset].decode("utf-8")), delimiter=";")
+    header = next(reader, None) or ["Date", "Time", "Value", "Note"]
+    closed, live = {}, []
+    for row in reader:
+        month = _row_month(row)
+        if month is not None and month < before_month:
+            closed.setdefault(month, []).append(row)
+        else:
+            live.append(row)
+    del data
+    if not closed:
+        return {}
+
+    os.makedirs(store.directory, exist_ok=True)
+    existing = set(store.months())
+    for month, rows in sorted(closed.items()):
+        if month in existing:
+            rows = read_segment_rows(store.path_for(month)) + rows
+        write_segment(store.path_for(month) + STAGED_SUFFIX, month, rows, codec)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+    writer.writerow(header)
+    writer.writerows(live)
+    staged_csv = data_path + STAGED_CSV_SUFFIX
+    _fsync_write(staged_csv, buffer.getvalue().encode("utf-8"))
+    offset = _carry_over(data_path, staged_csv, offset, inode)
+
+    with mornfeels_core.data_file_lock(data_path):
+        offset = _carry_over(data_path, staged_csv, offset, inode)
+        # Commit point: from here on a re-run publishes instead of redoing the merge
+        _fsync_write(os.path.join(store.directory, PENDING_MARKER),
+                     json.dumps({"months": sorted(closed), "offset": offset, "inode": inode}).encode("utf-8"))
+        _publish(data_path, store, sorted(closed))
+    return {month: len(rows) for month, rows in closed.items()}
@@ -0,0 +1,185 @@
+"""
+Lightweight timing instrumentation for Mornfeels.
+
+Records timing spans and counters for the load, filter, aggregate, render
+and PDF stages. Off by default; while off, span() returns a shared no-op
+context manager and count() returns immediately, so the instrumented code
+pays one flag check per call.
+
+Turn it on with the MORNFEELS_TRACE environment variable ("1" prints a text
+summary at exit, a path ending in .json or .txt writes the report there)
+or by calling enable(). Spans are aggregated per name (count, total, min,
+max), so memory use does not grow with the number of calls.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+
+# Environment variable that enables tracing for a whole run
+TRACE_ENV = "MORNFEELS_TRACE"
+
+_enabled = False
+_lock = threading.Lock()
+_spans = {}       # name -> [count, total_s, min_s, max_s]
+_counters = {}    # name -> int
+_started = time.time()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record_span(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def _record_span(name, seconds):
+    with _lock:
+        stats = _spans.get(name)
+        if stats is None:
+            _spans[name] = [1, seconds, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds < stats[2]:
+                stats[2] = seconds
+            if seconds > stats[3]:
+                stats[3] = seconds
+
+
+# ---------------------- Recording ----------------------------
+
+
+def enabled():
+    return _enabled
+
+
+def enable(on=True):
+    """Switch recording on (or off with on=False). Recorded data is kept."""
+    global _enabled
+    _enabled = bool(on)
+
+
+def reset():
+    """Forget all recorded spans and counters."""
+    global _started
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _started = time.time()
+
+
+def span(name):
+    """Context manager timing the enclosed block under name (no-op when disabled)."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def record(name, seconds):
+    """Add one span of the given duration under name, for blocks a with statement cannot wrap (no-op when disabled)."""
+    if _enabled:
+        _record_span(name, seconds)
+
+
+def count(name, n=1):
+    """Add n to the counter name (no-op when disabled)."""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+# ---------------------- Reports ----------------------------
+
+
+def snapshot():
+    """All recorded data as a JSON-serializable dict."""
+    with _lock:
+        spans = {
+            name: {"count": n, "total_ms": total * 1000, "mean_ms": total * 1000 / n,
+                   "min_ms": low * 1000, "max_ms": high * 1000}
+            for name, (n, total, low, high) in sorted(_spans.items())
+        }
+        counters = dict(sorted(_counters.items()))
+    return {"pid": os.getpid(), "started": _started, "spans": spans, "counters": counters}
+
+
+def merge(other):
+    """Add a snapshot() taken elsewhere (e.g. in a worker process) to this one."""
+    with _lock:
+        for name, stats in other.get("spans", {}).items():
+            mine = _spans.get(name)
+            n, total = stats["count"], stats["total_ms"] / 1000
+            low, high = stats["min_ms"] / 1000, stats["max_ms"] / 1000
+            if mine is None:
+                _spans[name] = [n, total, low, high]
+            else:
+                mine[0] += n
+                mine[1] += total
+                mine[2] = min(mine[2], low)
+                mine[3] = max(mine[3], high)
+        for name, value in other.get("counters", {}).items():
+            _counters[name] = _counters.get(name, 0) + value
+
+
+def to_json():
+    return json.dumps(snapshot(), indent=2)
+
+
+def summary_text():
+    """Human-readable table of spans (slowest total first) and counters."""
+    data = snapshot()
+    lines = [f"{'span':<32} {'count':>7} {'total ms':>10} {'mean ms':>9} {'max ms':>9}"]
+    for name, stats in sorted(data["spans"].items(), key=lambda item: -item[1]["total_ms"]):
+        lines.append(f"{name:<32} {stats['count']:>7} {stats['total_ms']:>10.1f} "
+                     f"{stats['mean_ms']:>9.2f} {stats['max_ms']:>9.1f}")
+    if data["counters"]:
+        lines.append("")
+        lines.append(f"{'counter':<32} {'value':>12}")
+        for name, value in data["counters"].items():
+            lines.append(f"{name:<32} {value:>12}")
+    return "\n".join(lines)
+
+
+def write_report(target):
+    """Write the report to a path (.json -> JSON, otherwise text) or "-" for stderr."""
+    if target in (None, "", "-", "1"):
+        print(summary_text(), file=sys.stderr)
+        return
+    text = to_json() if target.lower().endswith(".json") else summary_text()
+    with open(target, mode='w', encoding='utf-8') as f:
+        f.write(text + "\n")
+
+
+def _enable_from_environment():
+    target = os.environ.get(TRACE_ENV, "")
+    if target and target != "0":
+        enable()
+        atexit.register(write_report, target)
+
+
+_enable_from_environment()
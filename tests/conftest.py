@@ -0,0 +1,14 @@
+import csv
+import os
+import sys
+
+# The mornfeels_* modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def write_csv(path, rows):
+    """Write rows to a journal CSV at path, with the header the app writes."""
+    with open(path, mode="w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["Date", "Time", "Value", "Note"])
+        writer.writerows(rows)
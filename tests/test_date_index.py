@@ -0,0 +1,108 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+import mornfeels_core
+from conftest import write_csv
+from mornfeels_core import DateIndex
+
+
+def append_csv(path, rows):
+    with open(path, mode="a", newline="", encoding="utf-8") as f:
+        csv.writer(f, delimiter=";").writerows(rows)
+
+
+def day_rows(dates, per_day=3):
+    return [[d, f"{8 + i:02d}:00", str(i % 7), f"note {d} {i}"] for d in dates for i in range(per_day)]
+
+
+def between(rows, start_date, end_date):
+    return [row for row in rows if start_date <= row[0] <= end_date]
+
+
+class DateIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "data.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def index(self):
+        index = DateIndex(self.path)
+        index.refresh()
+        return index
+
+    def assertRanges(self, index, rows):
+        dates = sorted({row[0] for row in rows})
+        self.assertEqual(index.unique_dates(), dates)
+        for start_date, end_date in [(dates[0], dates[-1]), (dates[1], dates[1]),
+                                     (dates[1], dates[-2]), ("0000-01-01", dates[0]),
+                                     ("9999-01-01", "9999-12-31")]:
+            self.assertEqual(index.read_range(start_date, end_date), between(rows, start_date, end_date))
+
+    def test_ranges(self):
+        rows = day_rows(["2025-01-01", "2025-01-02", "2025-01-05", "2025-02-01"])
+        write_csv(self.path, rows)
+        self.assertRanges(self.index(), rows)
+
+    def test_appends_extend_the_index(self):
+        rows = day_rows(["2025-01-01", "2025-01-02"])
+        write_csv(self.path, rows)
+        index = self.index()
+        # Same day as the last run, then new days
+        more = day_rows(["2025-01-02", "2025-01-03", "2025-01-04"], per_day=2)
+        append_csv(self.path, more)
+        index.refresh()
+        self.assertRanges(index, rows + more)
+        self.assertEqual(index.dates, ["2025-01-01", "2025-01-02", "2025-01-03", "2025-01-04"])
+        # A new session picks the sidecar up and scans only what follows it
+        self.assertRanges(self.index(), rows + more)
+
+    def test_out_of_order_dates(self):
+        rows = day_rows(["2025-01-03", "2025-01-01", "2025-01-03", "2025-01-02"], per_day=2)
+        write_csv(self.path, rows)
+        index = self.index()
+        self.assertFalse(index.is_sorted)
+        self.assertRanges(index, rows)
+        # Both runs of 2025-01-03, in file order
+        self.assertEqual(index.read_range("2025-01-03", "2025-01-03"), between(rows, "2025-01-03", "2025-01-03"))
+        more = day_rows(["2025-01-01"])
+        append_csv(self.path, more)
+        self.assertRanges(self.index(), rows + more)
+
+    def test_truncated_file_is_reindexed(self):
+        rows = day_rows(["2025-01-01", "2025-01-02", "2025-01-03", "2025-01-04"])
+        write_csv(self.path, rows)
+        index = self.index()
+        write_csv(self.path, rows[:5])
+        index.refresh()
+        self.assertRanges(index, rows[:5])
+        self.assertRanges(self.index(), rows[:5])
+
+    def test_rewritten_file_is_reindexed(self):
+        rows = day_rows(["2025-01-01", "2025-01-02", "2025-01-03"])
+        write_csv(self.path, rows)
+        index = self.index()
+        # Longer, but the last indexed run no longer starts where it did
+        changed = day_rows(["2024-12-31", "2025-01-01", "2025-01-02", "2025-01-03"])
+        write_csv(self.path, changed)
+        index.refresh()
+        self.assertRanges(index, changed)
+
+    def test_ranges_read_in_small_blocks(self):
+        rows = day_rows([f"2025-01-{day:02d}" for day in range(1, 29)], per_day=5)
+        write_csv(self.path, rows)
+        block_bytes = mornfeels_core.READ_BLOCK_BYTES
+        mornfeels_core.READ_BLOCK_BYTES = 50
+        try:
+            self.assertRanges(self.index(), rows)
+        finally:
+            mornfeels_core.READ_BLOCK_BYTES = block_bytes
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+import mornfeels_core
+from mornfeels_core import MoodRecords
+
+try:
+    import mornfeels_numpy
+except ImportError:
+    mornfeels_numpy = None
+
+ROWS = [
+    ["2025-01-02", "08:00", "3", "canonical"],
+    ["2025-01-01", "21:15:09", "0"],
+    ["2025-01-02", "8:00", "4", "unpadded hour"],
+    ["2025-01-02", "０9:00", "5", "full-width digit"],
+    ["2025-01-02", "09:00:5", "5", "short seconds"],
+    ["2025-01-02", "09:00abc", "5", "trailing text"],
+    ["2025-01-02", "09:00:00:00", "5", "too many parts"],
+    ["2025-01-02", "09:00:0012", "5", "long seconds"],
+    ["2025-01-02", "", "5", "no time"],
+    ["2025-01-03", "10:00", "00003", "padded value"],
+    ["2025-01-03", "10:00", " 6", "blank before value"],
+    ["2025-01-03", "10:00", "-1", "negative value"],
+    ["2025-01-03", "10:00", "200", "value out of range"],
+    ["2025-01-03", "10:00", "x", "not a number"],
+    ["2025-01", "10:00", "2", "partial date"],
+    [" 2025-01-03", "10:00", "2", "blank before date"],
+    ["20250104", "10:00", "2", "basic ISO date"],
+    ["2025-02-30", "10:00", "2", "impossible date"],
+    ["2025-01-04", "10:00"],
+]
+
+
+@unittest.skipIf(mornfeels_numpy is None, "NumPy is not installed")
+class BackendAgreementTest(unittest.TestCase):
+
+    def assertSameEntries(self, rows):
+        records = MoodRecords.from_rows(rows)
+        arrays = mornfeels_numpy.MoodArrays.from_rows(rows)
+        self.assertEqual(arrays.aggregate(), records.aggregate())
+        self.assertEqual([d.item().toordinal() for d in arrays.dates], list(records.days))
+        self.assertEqual(arrays.seconds.tolist(), list(records.seconds))
+        self.assertEqual(arrays.values.tolist(), list(records.values))
+
+    def test_odd_rows(self):
+        self.assertSameEntries(ROWS)
+
+    def test_each_row_alone(self):
+        for row in ROWS:
+            with self.subTest(row=row):
+                self.assertSameEntries([row])
+
+    def test_canonical_rows(self):
+        rows = [[f"2025-01-{day:02d}", f"{hour:02d}:{hour * 2:02d}:{hour:02d}", str((day + hour) % 7)]
+                for day in range(28, 0, -1) for hour in range(0, 24, 5)]
+        self.assertSameEntries(rows)
+
+    def test_max_mood_value(self):
+        self.assertSameEntries([["2025-01-01", "08:00", str(mornfeels_core.MAX_MOOD_VALUE)],
+                                ["2025-01-01", "08:00", str(mornfeels_core.MAX_MOOD_VALUE + 1)]])
+
+
+if __name__ == "__main__":
+    unittest.main()
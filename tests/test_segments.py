@@ -0,0 +1,194 @@
+import csv
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import mornfeels_core
+import mornfeels_segments
+from conftest import write_csv
+from mornfeels_segments import SegmentError, decode_rows, encode_rows
+
+
+def read_csv(path):
+    with open(path, mode="r", newline="", encoding="utf-8") as f:
+        return list(csv.reader(f, delimiter=";"))[1:]
+
+
+def month_rows(month, days, note="n"):
+    return [[f"{month}-{day:02d}", "08:00", str(day % 7), note] for day in range(1, days + 1)]
+
+
+class EncodeRowsTest(unittest.TestCase):
+
+    def test_canonical_rows_round_trip(self):
+        rows = [["2025-01-01", "08:00", "3", "coffee"], ["2025-01-01", "21:15:09", "0"],
+                ["2025-01-31", "00:00", "6", ""]]
+        self.assertEqual(decode_rows(encode_rows(rows, "2025-01"), "2025-01"), rows)
+
+    def test_non_canonical_rows_round_trip(self):
+        rows = [
+            ["2025-01-05", "8:00", "3", "unpadded hour"],
+            ["2025-01-05", "08:00", "03", "padded value"],
+            ["2025-01-05", "08:00", "+3", "signed value"],
+            ["2025-01-05", "08:00", " 3", "blank before value"],
+            ["2025-01-05", "08:00", "200", "value out of int8 range"],
+            ["2025-01-05", "08:00", "-1", "negative value"],
+            ["2025-01-05", "24:61", "3", "impossible time"],
+            ["2025-01-05", "08:00:00:00", "3", "too many time parts"],
+            ["2025-01-05", "08:00", "x", "not a number"],
+            ["2025-1-05", "08:00", "3", "unpadded month"],
+            ["2025-02-01", "08:00", "3", "other month"],
+            ["2025-01-05", "08:00", "3", "extra", "field"],
+            ["2025-01-05", "08:00"],
+            ["garbage"],
+            [],
+            ["2025-01-05", "08:00", "4", "semi;colon \"quoted\" café ☕"],
+        ]
+        self.assertEqual(decode_rows(encode_rows(rows, "2025-01"), "2025-01"), rows)
+
+    def test_truncated_payload_is_an_error(self):
+        payload = encode_rows(month_rows("2025-01", 3), "2025-01")
+        with self.assertRaises(SegmentError):
+            decode_rows(payload[:-2], "2025-01")
+
+
+class SegmentFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "2025-01.seg")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip_with_each_codec(self):
+        rows = month_rows("2025-01", 31) + [["2025-01-02", "7:30", "05", "odd"]]
+        for codec in mornfeels_segments.CODECS:
+            mornfeels_segments.write_segment(self.path, "2025-01", rows, codec)
+            self.assertEqual(mornfeels_segments.read_segment_rows(self.path), rows)
+            meta = mornfeels_segments.read_segment_meta(self.path)
+            self.assertEqual(meta["rows"], len(rows))
+            self.assertEqual(meta["daily"]["2025-01-02"], {2: 1, 5: 1})
+
+    def test_damaged_file_is_an_error(self):
+        mornfeels_segments.write_segment(self.path, "2025-01", month_rows("2025-01", 31))
+        with open(self.path, mode="r+b") as f:
+            f.seek(-3, os.SEEK_END)
+            f.write(b"\x00\x00\x00")
+        with self.assertRaises(SegmentError):
+            mornfeels_segments.read_segment_rows(self.path)
+
+
+class CompactTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "data.csv")
+        self.rows = month_rows("2025-01", 20) + month_rows("2025-02", 10) + month_rows("2025-03", 5)
+        write_csv(self.path, self.rows)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def journal_rows(self):
+        return mornfeels_core.get_storage(self.path).read_range("0000-01-01", "9999-12-31")
+
+    def test_compacted_journal_reads_the_same(self):
+        moved = mornfeels_segments.compact(self.path, before_month="2025-03")
+        self.assertEqual(moved, {"2025-01": 20, "2025-02": 10})
+        self.assertEqual(read_csv(self.path), month_rows("2025-03", 5))
+        self.assertEqual(self.journal_rows(), self.rows)
+
+    def test_interrupted_compaction_does_not_duplicate_rows(self):
+        mornfeels_segments.compact(self.path, before_month="2025-02")
+        late = [["2025-01-31", "09:00", "2", "late"]]
+        with open(self.path, mode="a", newline="", encoding="utf-8") as f:
+            csv.writer(f, delimiter=";").writerows(late)
+        # Stop right before the commit marker is written
+        write = mornfeels_segments._fsync_write
+
+        def crash(path, data, mode="wb"):
+            if path.endswith(mornfeels_segments.PENDING_MARKER):
+                raise OSError("crash")
+            return write(path, data, mode)
+
+        mornfeels_segments._fsync_write = crash
+        try:
+            with self.assertRaises(OSError):
+                mornfeels_segments.compact(self.path, before_month="2025-03")
+        finally:
+            mornfeels_segments._fsync_write = write
+        self.assertEqual(sorted(self.journal_rows()), sorted(self.rows + late))
+        mornfeels_segments.compact(self.path, before_month="2025-03")
+        self.assertEqual(sorted(self.journal_rows()), sorted(self.rows + late))
+        self.assertEqual(read_csv(self.path), month_rows("2025-03", 5))
+
+    def test_committed_compaction_is_finished_by_the_next_run(self):
+        publish = mornfeels_segments._publish
+
+        def crash(*args):
+            raise OSError("crash")
+
+        mornfeels_segments._publish = crash
+        try:
+            with self.assertRaises(OSError):
+                mornfeels_segments.compact(self.path, before_month="2025-03")
+        finally:
+            mornfeels_segments._publish = publish
+        appended = [["2025-03-20", "10:00", "4", "after the crash"]]
+        with open(self.path, mode="a", newline="", encoding="utf-8") as f:
+            csv.writer(f, delimiter=";").writerows(appended)
+        self.assertEqual(mornfeels_segments.compact(self.path, before_month="2025-03"), {})
+        self.assertEqual(self.journal_rows(), self.rows + appended)
+        self.assertEqual(read_csv(self.path), month_rows("2025-03", 5) + appended)
+
+    def test_rows_appended_during_compaction_are_kept(self):
+        appended = [["2025-03-30", "22:00", "1", "written while compacting"]]
+        write_segment = mornfeels_segments.write_segment
+
+        def write_and_append(*args, **kwargs):
+            write_segment(*args, **kwargs)
+            with open(self.path, mode="a", newline="", encoding="utf-8") as f:
+                csv.writer(f, delimiter=";").writerows(appended)
+
+        mornfeels_segments.write_segment = write_and_append
+        try:
+            mornfeels_segments.compact(self.path, before_month="2025-03")
+        finally:
+            mornfeels_segments.write_segment = write_segment
+        self.assertEqual(read_csv(self.path), month_rows("2025-03", 5) + appended * 2)
+
+    def test_derived_data_survives_compaction(self):
+        self.rows[3][3] = "coffee"
+        write_csv(self.path, self.rows)
+        statistics = mornfeels_core.get_statistics(self.path)
+        index = mornfeels_core.get_note_index(self.path)
+        mornfeels_core.save_entry(self.path, 4, "coffee again")
+        mornfeels_segments.compact(self.path, before_month="2025-03")
+        signature = mornfeels_core.get_storage(self.path).signature()
+        self.assertEqual(statistics.signature, signature)
+        self.assertEqual(index.signature, signature)
+        # Also in a new session, from the sidecars alone
+        for cache in (mornfeels_core._statistics, mornfeels_core._note_indexes):
+            cache.pop(self.path, None)
+        self.assertEqual(mornfeels_core._read_sidecar(mornfeels_core._statistics_path(self.path),
+                                                      mornfeels_core.Statistics).signature, signature)
+        self.assertEqual(len(mornfeels_core.search_notes("coffee", file_path=self.path)), 2)
+
+    def test_appends_wait_for_the_lock(self):
+        appended = [["2025-03-30", "22:00", "1", "waited"]]
+        storage = mornfeels_core.get_storage(self.path)
+        writer = threading.Thread(target=storage.append_rows, args=(appended,))
+        with mornfeels_core.data_file_lock(self.path):
+            writer.start()
+            writer.join(0.2)
+            self.assertTrue(writer.is_alive())
+            self.assertEqual(read_csv(self.path), self.rows)
+        writer.join()
+        self.assertEqual(read_csv(self.path), self.rows + appended)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+import mornfeels_core
+
+
+def statistics_state(statistics):
+    levels = {level: {key: (s.n, round(s.mean, 9), round(s.m2, 6)) for key, s in buckets.items()}
+              for level, buckets in statistics.levels.items()}
+    return levels, [(s.n, round(s.mean, 9)) for s in statistics.hours]
+
+
+class SidecarLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "data.csv")
+        with open(self.path, mode="w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(["Date", "Time", "Value", "Note"])
+            writer.writerows([[f"2025-01-{day:02d}", "08:00", str(day % 7), f"walk {day}"]
+                              for day in range(1, 21)])
+        mornfeels_core.get_statistics(self.path)
+        mornfeels_core.get_note_index(self.path)
+
+    def tearDown(self):
+        for cache in (mornfeels_core._statistics, mornfeels_core._note_indexes):
+            cache.pop(self.path, None)
+        shutil.rmtree(self.directory)
+
+    def new_session(self):
+        for cache in (mornfeels_core._statistics, mornfeels_core._note_indexes):
+            cache.pop(self.path, None)
+
+    def rebuilt_statistics(self):
+        storage = mornfeels_core.get_storage(self.path)
+        dates = storage.unique_dates()
+        return mornfeels_core.Statistics.from_rows(storage.read_range(dates[0], dates[-1]))
+
+    def test_saves_go_to_the_logs(self):
+        sidecar = self.path + mornfeels_core.STATISTICS_SUFFIX
+        size = os.path.getsize(sidecar)
+        for i in range(5):
+            mornfeels_core.save_entries(self.path, [["2025-01-21", f"1{i}:00", i, f"coffee {i}"]])
+        self.assertEqual(os.path.getsize(sidecar), size)
+        self.new_session()
+        statistics = mornfeels_core.get_statistics(self.path)
+        self.assertEqual(statistics.logged, 5)
+        self.assertEqual(statistics_state(statistics), statistics_state(self.rebuilt_statistics()))
+        self.assertEqual(len(mornfeels_core.search_notes("coffee", file_path=self.path)), 5)
+
+    def test_long_log_is_folded_into_the_sidecar(self):
+        rows = [["2025-01-22", "09:00", 3, "tea"]] * mornfeels_core.SIDECAR_LOG_MAX_ROWS
+        mornfeels_core.save_entries(self.path, rows)
+        self.assertFalse(os.path.exists(self.path + mornfeels_core.STATISTICS_LOG_SUFFIX))
+        self.assertFalse(os.path.exists(self.path + mornfeels_core.NOTE_LOG_SUFFIX))
+        self.new_session()
+        self.assertEqual(mornfeels_core.get_statistics(self.path).logged, 0)
+        self.assertEqual(len(mornfeels_core.search_notes("tea", file_path=self.path)), len(rows))
+
+    def test_torn_log_line_is_ignored(self):
+        mornfeels_core.save_entries(self.path, [["2025-01-21", "10:00", 2, "coffee"]])
+        with open(self.path + mornfeels_core.STATISTICS_LOG_SUFFIX, mode="a", encoding="utf-8") as f:
+            f.write('{"base": [1, ')
+        self.new_session()
+        statistics = mornfeels_core.get_statistics(self.path)
+        self.assertEqual(statistics_state(statistics), statistics_state(self.rebuilt_statistics()))
+
+    def test_stale_statistics_are_not_rebuilt_on_save(self):
+        # Written behind the app's back: the statistics no longer match
+        with open(self.path, mode="a", newline="", encoding="utf-8") as f:
+            csv.writer(f, delimiter=";").writerow(["2025-01-21", "10:00", "6", ""])
+        stale = mornfeels_core._statistics[self.path]
+        mornfeels_core.save_entries(self.path, [["2025-01-21", "11:00", 5, ""]])
+        self.assertIs(mornfeels_core._statistics[self.path], stale)
+        self.assertNotEqual(stale.signature, mornfeels_core.get_storage(self.path).signature())
+        statistics = mornfeels_core.get_statistics(self.path)
+        self.assertEqual(statistics_state(statistics), statistics_state(self.rebuilt_statistics()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mornfeels_core import TailReader
+
+HEADER = b"Date;Time;Value;Note\r\n"
+
+
+class TailReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "data.csv")
+        self.write(HEADER + b"2025-01-01;08:00;3;a\r\n")
+        self.reader = TailReader(self.path)
+        self.assertEqual(self.reader.read(), (HEADER + b"2025-01-01;08:00;3;a\r\n", True))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, data, mode="wb"):
+        with open(self.path, mode=mode) as f:
+            f.write(data)
+
+    def bump_mtime(self):
+        # Make the change visible even on file systems with coarse timestamps
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    def test_unchanged_file(self):
+        self.assertEqual(self.reader.read(), (b"", False))
+
+    def test_appends_return_only_new_lines(self):
+        self.write(b"2025-01-02;09:00;4;b\r\n", mode="ab")
+        self.assertEqual(self.reader.read(), (b"2025-01-02;09:00;4;b\r\n", False))
+        self.write(b"2025-01-03;10:00;5;c\r\n2025-01-04;11:00;6;d\r\n", mode="ab")
+        self.assertEqual(self.reader.read(), (b"2025-01-03;10:00;5;c\r\n2025-01-04;11:00;6;d\r\n", False))
+
+    def test_half_written_line_waits(self):
+        self.write(b"2025-01-02;09:0", mode="ab")
+        self.assertEqual(self.reader.read(), (b"", False))
+        self.write(b"0;4;b\r\n", mode="ab")
+        self.assertEqual(self.reader.read(), (b"2025-01-02;09:00;4;b\r\n", False))
+
+    def test_same_size_rewrite_reads_everything(self):
+        self.write(HEADER + b"2025-01-01;08:00;6;z\r\n")
+        self.bump_mtime()
+        self.assertEqual(self.reader.read(), (HEADER + b"2025-01-01;08:00;6;z\r\n", True))
+        self.assertEqual(self.reader.read(), (b"", False))
+        self.write(b"2025-01-02;09:00;4;b\r\n", mode="ab")
+        self.assertEqual(self.reader.read(), (b"2025-01-02;09:00;4;b\r\n", False))
+
+    def test_growing_rewrite_reads_everything(self):
+        data = HEADER + b"2025-01-01;08:00;1;changed\r\n2025-01-02;09:00;4;b\r\n"
+        self.write(data)
+        self.assertEqual(self.reader.read(), (data, True))
+
+    def test_truncation_reads_everything(self):
+        self.write(HEADER)
+        self.assertEqual(self.reader.read(), (HEADER, True))
+
+    def test_replaced_file_reads_everything(self):
+        tmp_path = self.path + ".tmp"
+        data = HEADER + b"2025-01-01;08:00;3;a\r\n2025-01-02;09:00;4;b\r\n"
+        with open(tmp_path, mode="wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        self.assertEqual(self.reader.read(), (data, True))
+
+    def test_missing_file(self):
+        os.remove(self.path)
+        self.assertEqual(self.reader.read(), (b"", True))
+        self.write(HEADER)
+        self.assertEqual(self.reader.read(), (HEADER, True))
+
+
+if __name__ == "__main__":
+    unittest.main()